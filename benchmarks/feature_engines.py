@@ -0,0 +1,39 @@
+"""
+Benchmark of the feature engines ("duckdb", "polars", "numpy") on the same
+synthetic panel. Parity between them is covered by tests/test_feature_engines.py.
+
+    python -m benchmarks.feature_engines --clients 200000 --repeat 3
+"""
+import argparse
+import time
+
+from src.core.feature_engineering import feature_engineering_pipeline
+from tests.synthetic import ENGINE_CONFIG, make_panel
+
+ENGINES = ("duckdb", "polars", "numpy")
+
+def run(n_clients: int, repeat: int, engines: tuple[str, ...] = ENGINES) -> dict[str, float]:
+    """Best wall time in seconds per engine over 'repeat' runs."""
+    df = make_panel(n_clients)
+    print(f"Panel: {df.height:,} rows, {df.width} columns")
+
+    timings = {}
+    for engine in engines:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            features = feature_engineering_pipeline(df, ENGINE_CONFIG, engine=engine)
+            best = min(best, time.perf_counter() - start)
+        timings[engine] = best
+        print(f"{engine:>8}: {best:7.2f} s ({features.width - df.width} features)")
+
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    args = parser.parse_args()
+
+    run(args.clients, args.repeat, tuple(args.engines))
@@ -2,14 +2,19 @@ import logging
 
 import src.config.conf as cf
 import src.infra.loader_utils as lu
+import src.infra.duckdb_runner as dr
 import src.core.col_selection as cs
-import src.core.feature_engineering as fe
+import src.core.feature_store as fs
+import src.core.dtype_compaction as dc
+import src.core.target as tg
 import src.core.preprocessing as pp
 import src.config.logger_config as lc
 import src.ml.lgbm_optimization as lo
 import src.ml.lgbm_train_test as tt
+import src.ml.feature_pruning as fp
 
 from src.ml.optimization_config import OptimizationConfig
+from src.infra.stats_catalog import StatsCatalog
 
 import optuna
 import json
@@ -44,6 +49,19 @@ LGBM_N_TRIALS = cfg.get('LGBM_N_TRIALS', None)
 LGBM_N_FOLDS = cfg.get('LGBM_N_FOLDS', None)
 LGBM_N_BOOSTS = cfg.get('LGBM_N_BOOSTS', None)
 LGBM_THRESHOLD = cfg.get('LGBM_THRESHOLD', None)
+LGBM_N_WORKERS = cfg.get('LGBM_N_WORKERS', 1)
+LGBM_NUM_THREADS = cfg.get('LGBM_NUM_THREADS', None)
+LGBM_PRUNER = cfg.get('LGBM_PRUNER', None)
+LGBM_PRUNE_INTERVAL = cfg.get('LGBM_PRUNE_INTERVAL', 10)
+LGBM_PRUNE_WARMUP = cfg.get('LGBM_PRUNE_WARMUP', 100)
+LGBM_FIDELITY_RATIO = cfg.get('LGBM_FIDELITY_RATIO', None)
+LGBM_LOW_FIDELITY_TRIALS = cfg.get('LGBM_LOW_FIDELITY_TRIALS', None)
+LGBM_PROMOTE_TOP = cfg.get('LGBM_PROMOTE_TOP', 10)
+
+FE_ENGINE = cfg.get('FE_ENGINE', 'duckdb')
+FE_MAX_COLUMNS = cfg.get('FE_MAX_COLUMNS', None)
+
+DUCKDB_SETTINGS = cfg.get('DUCKDB', None)
 
 # Paths
 
@@ -52,6 +70,11 @@ PATH_LOGS = paths.get('LOGS', None)
 
 ## Input
 PATH_DATA = paths.get('INPUT_DATA', None)
+PATH_CACHE = paths.get('CACHE', None)
+PATH_FEATURES = paths.get('FEATURES', None)
+PATH_DATASETS = paths.get('DATASETS', None)
+PATH_CATALOG = paths.get('CATALOG', None)
+PATH_STORE = paths.get('STORE', None)
 
 ## Output
 PATH_LGBM_OPT = paths.get('OUTPUT_LGBM_OPTIMIZATION', None)
@@ -59,6 +82,7 @@ PATH_LGBM_OPT_BEST_PARAMS = paths.get('OUTPUT_LGBM_OPTIMIZATION_BEST_PARAMS', No
 PATH_LGBM_OPT_DB = paths.get('OUTPUT_LGBM_OPTIMIZATION_DB', None)
 
 PATH_LGBM_MODEL = paths.get('OUTPUT_LGBM_MODEL', None)
+PATH_PRUNED_FEATURES = paths.get('OUTPUT_PRUNED_FEATURES', None)
 
 PATH_PREDICTION = paths.get('OUTPUT_PREDICTION')
 
@@ -69,13 +93,23 @@ def main():
     logger.info("STARTING this wonderful pipeline!")
 
     # 0. Load data
-    df = lu.load_data(f"{PATH_DATA}competencia_01.csv", "csv")
+    df = lu.load_data(f"{PATH_DATA}competencia_01.csv", "csv", cache_dir=PATH_CACHE)
+
+    # 0.1 Integer compaction before the features: lags and deltas inherit the small types
+    df = dc.compact_dtypes(df, floats=False)
 
     # 1. Columns selection
-    cols_lag_delta_max_min_regl, cols_ratios = cs.col_selection(df)
+    drop_features = fp.load_pruned_features(PATH_PRUNED_FEATURES)
+    catalog = StatsCatalog.for_source(f"{PATH_DATA}competencia_01.csv", PATH_CATALOG, cache_dir=PATH_CACHE)
+    cols_lag_delta_max_min_regl, cols_ratios = cs.col_selection(
+        df,
+        catalog=catalog,
+        exclude_degenerate_months=MONTH_TRAIN + [MONTH_VALIDATION],
+        drop_features=drop_features
+    )
 
     # 2. Feature Engineering
-    df = fe.feature_engineering_pipeline(df, {
+    df = fs.assemble_features(df, {
         "lag": {
             "columns": cols_lag_delta_max_min_regl,
             "n": 2
@@ -94,14 +128,18 @@ def main():
             "columns": cols_lag_delta_max_min_regl,
             "window": 3
         }
-    })
+    }, store_dir=PATH_FEATURES, engine=FE_ENGINE, max_columns=FE_MAX_COLUMNS, drop_features=drop_features, output_months=MONTH_TRAIN + [MONTH_VALIDATION])
+
+    # 2.1 Dtype compaction of the generated features (Float64 -> Float32)
+    df = dc.compact_dtypes(df)
 
     # 3. Preprocessing
     X_train, y_train_binary, w_train, X_test, y_test_binary, y_test_class, w_test = pp.preprocessing_pipeline(
         df,
         BINARY_POSITIVES,
         MONTH_TRAIN,
-        MONTH_VALIDATION
+        MONTH_VALIDATION,
+        output="numpy"
     )
 
     # 4. Hyperparameters optimization
@@ -116,7 +154,16 @@ def main():
         n_folds=LGBM_N_FOLDS,
         n_boosts=LGBM_N_BOOSTS,
         seeds=SEEDS,
-        output_path=PATH_LGBM_OPT
+        output_path=PATH_LGBM_OPT,
+        dataset_cache_dir=PATH_DATASETS,
+        n_workers=LGBM_N_WORKERS,
+        num_threads=LGBM_NUM_THREADS,
+        pruner=LGBM_PRUNER,
+        prune_interval=LGBM_PRUNE_INTERVAL,
+        prune_warmup=LGBM_PRUNE_WARMUP,
+        fidelity_ratio=LGBM_FIDELITY_RATIO,
+        low_fidelity_trials=LGBM_LOW_FIDELITY_TRIALS,
+        promote_top=LGBM_PROMOTE_TOP
     )
  
     study = lo.run_lgbm_optimization(X_train, y_train_binary, w_train, opt_cfg)
@@ -133,7 +180,8 @@ def main():
         name=STUDY_NAME,
 
         output_path=PATH_LGBM_MODEL,
-        seeds=SEEDS
+        seeds=SEEDS,
+        dataset_cache_dir=PATH_DATASETS
 
     )
     model_lgbm = tt.entrenamiento_lgbm(X_train , y_train_binary, w_train ,best_iter,best_params , tt_cfg)
@@ -151,13 +199,23 @@ def kaggle_prediction():
     logger.info("STARTING this wonderful pipeline!")
 
     # 0. Load data
-    df = lu.load_data(f"{PATH_DATA}competencia_01.csv", "csv")
+    df = lu.load_data(f"{PATH_DATA}competencia_01.csv", "csv", cache_dir=PATH_CACHE)
+
+    # 0.1 Integer compaction before the features: lags and deltas inherit the small types
+    df = dc.compact_dtypes(df, floats=False)
 
     # 1. Columns selection
-    cols_lag_delta_max_min_regl, cols_ratios = cs.col_selection(df)
+    drop_features = fp.load_pruned_features(PATH_PRUNED_FEATURES)
+    catalog = StatsCatalog.for_source(f"{PATH_DATA}competencia_01.csv", PATH_CATALOG, cache_dir=PATH_CACHE)
+    cols_lag_delta_max_min_regl, cols_ratios = cs.col_selection(
+        df,
+        catalog=catalog,
+        exclude_degenerate_months=MONTH_TRAIN + [MONTH_VALIDATION, MONTH_TEST],
+        drop_features=drop_features
+    )
 
     # 2. Feature Engineering
-    df = fe.feature_engineering_pipeline(df, {
+    df = fs.assemble_features(df, {
         "lag": {
             "columns": cols_lag_delta_max_min_regl,
             "n": 2
@@ -172,11 +230,14 @@ def kaggle_prediction():
         "ratio": {
             "pairs": cols_ratios
         },
-        # "linreg": {
-        #     "columns": cols_lag_delta_max_min_regl,
-        #     "window": 3
-        # }
-    })
+        "linreg": {
+            "columns": cols_lag_delta_max_min_regl,
+            "window": 3
+        }
+    }, store_dir=PATH_FEATURES, engine=FE_ENGINE, max_columns=FE_MAX_COLUMNS, drop_features=drop_features, output_months=MONTH_TRAIN + [MONTH_VALIDATION, MONTH_TEST])
+
+    # 2.1 Dtype compaction of the generated features (Float64 -> Float32)
+    df = dc.compact_dtypes(df)
 
     # 3. Preprocessing
     MONTH_TRAIN.append(MONTH_VALIDATION)
@@ -185,7 +246,8 @@ def kaggle_prediction():
         df,
         BINARY_POSITIVES,
         MONTH_TRAIN,
-        MONTH_TEST
+        MONTH_TEST,
+        output="numpy"
     )
 
     # 4. Best hyperparams loading
@@ -207,7 +269,8 @@ def kaggle_prediction():
         name=STUDY_NAME,
 
         output_path=PATH_LGBM_MODEL,
-        seeds=SEEDS
+        seeds=SEEDS,
+        dataset_cache_dir=PATH_DATASETS
     )
     
     model_lgbm = tt.entrenamiento_lgbm(X_train, y_train_binary, w_train ,best_iter,best_params , tt_cfg)
@@ -225,8 +288,8 @@ def kaggle_prediction():
     # Number of clients you want to mark as positive
 
     # Keep predictions
-    y_test_binary = X_test[["numero_de_cliente"]].copy()
-    y_test_binary["PredictedProb"] = model_lgbm.predict(X_test)
+    y_test_binary = X_test.ids()
+    y_test_binary["PredictedProb"] = model_lgbm.predict(X_test.X)
 
     # Sort descending by predicted probability
     y_test_binary = y_test_binary.sort_values("PredictedProb", ascending=False)
@@ -254,13 +317,23 @@ def evaluate_threshold():
     logger.info("STARTING this wonderful pipeline!")
 
     # 0. Load data
-    df = lu.load_data(f"{PATH_DATA}competencia_01.csv", "csv")
+    df = lu.load_data(f"{PATH_DATA}competencia_01.csv", "csv", cache_dir=PATH_CACHE)
+
+    # 0.1 Integer compaction before the features: lags and deltas inherit the small types
+    df = dc.compact_dtypes(df, floats=False)
 
     # 1. Columns selection
-    cols_lag_delta_max_min_regl, cols_ratios = cs.col_selection(df)
+    drop_features = fp.load_pruned_features(PATH_PRUNED_FEATURES)
+    catalog = StatsCatalog.for_source(f"{PATH_DATA}competencia_01.csv", PATH_CATALOG, cache_dir=PATH_CACHE)
+    cols_lag_delta_max_min_regl, cols_ratios = cs.col_selection(
+        df,
+        catalog=catalog,
+        exclude_degenerate_months=MONTH_TRAIN + [MONTH_VALIDATION],
+        drop_features=drop_features
+    )
 
     # 2. Feature Engineering
-    df = fe.feature_engineering_pipeline(df, {
+    df = fs.assemble_features(df, {
         "lag": {
             "columns": cols_lag_delta_max_min_regl,
             "n": 2
@@ -275,18 +348,22 @@ def evaluate_threshold():
         "ratio": {
             "pairs": cols_ratios
         },
-        # "linreg": {
-        #     "columns": cols_lag_delta_max_min_regl,
-        #     "window": 3
-        # }
-    })
+        "linreg": {
+            "columns": cols_lag_delta_max_min_regl,
+            "window": 3
+        }
+    }, store_dir=PATH_FEATURES, engine=FE_ENGINE, max_columns=FE_MAX_COLUMNS, drop_features=drop_features, output_months=MONTH_TRAIN + [MONTH_VALIDATION])
+
+    # 2.1 Dtype compaction of the generated features (Float64 -> Float32)
+    df = dc.compact_dtypes(df)
 
     # 3. Preprocessing
     X_train, y_train_binary, w_train, X_test, y_test_binary, y_test_class, w_test = pp.preprocessing_pipeline(
         df,
         BINARY_POSITIVES,
         MONTH_TRAIN,
-        MONTH_VALIDATION
+        MONTH_VALIDATION,
+        output="numpy"
     )
 
     # 4. Best hyperparams loading
@@ -308,14 +385,15 @@ def evaluate_threshold():
         name=STUDY_NAME,
 
         output_path=PATH_LGBM_MODEL,
-        seeds=SEEDS
+        seeds=SEEDS,
+        dataset_cache_dir=PATH_DATASETS
     )
     
     model_lgbm = tt.entrenamiento_lgbm(X_train, y_train_binary, w_train ,best_iter,best_params , tt_cfg)
 
     # 6. Prediction
 
-    y_pred = model_lgbm.predict(X_test)
+    y_pred = model_lgbm.predict(X_test.X)
 
     # 7. Ganancia
 
@@ -361,6 +439,20 @@ def evaluate_threshold():
 
     logger.info("Pipeline ENDED!")
 
+def build_store():
+    """
+    Labels competencia_01_crudo.csv with clase_ternaria and writes it to the
+    foto_mes-partitioned store (replaces the 01_target_sql notebook export).
+    """
+    tg.build_labeled_store(f"{PATH_DATA}competencia_01_crudo.csv", PATH_STORE)
+
+def prune_features():
+    """
+    Writes the pruned feature list from the gain importance of the saved
+    models. The next runs stop generating the features the models dropped.
+    """
+    fp.write_pruned_features(PATH_LGBM_MODEL, PATH_PRUNED_FEATURES)
+
 def get_top_n_predictions(csv_path: str, n: int) -> pl.DataFrame:
     """
     Reads a CSV with columns ['numero_de_cliente', 'PredictedProb', 'Predicted']
@@ -407,7 +499,10 @@ if __name__ == "__main__":
         PATH_PREDICTION
     )
     lc.setup_logging(PATH_LOGS)
+    dr.configure_duckdb(DUCKDB_SETTINGS)
 
+    # build_store()
+    # prune_features()
     # main()
     kaggle_prediction()
     # compare()
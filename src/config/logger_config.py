@@ -2,15 +2,35 @@ import logging
 import os
 import datetime
 
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s %(lineno)d - %(message)s"
+
 def setup_logging(log_dir: str = "logs") -> None:
     date_now = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     log_file = os.path.join(log_dir, f"log_{date_now}.log")
 
+    # The file name is new on every run; append mode (O_APPEND) lets worker
+    # processes write to it too without overwriting each other
     logging.basicConfig(
         level=logging.DEBUG,
-        format="%(asctime)s [%(levelname)s] %(name)s %(lineno)d - %(message)s",
+        format=LOG_FORMAT,
         handlers=[
-            logging.FileHandler(log_file, mode="w", encoding="utf-8"),
+            logging.FileHandler(log_file, mode="a", encoding="utf-8"),
             logging.StreamHandler()
         ]
     )
+
+def log_files() -> list[str]:
+    """Files the root logger of this process writes to."""
+    return [h.baseFilename for h in logging.getLogger().handlers if isinstance(h, logging.FileHandler)]
+
+def setup_worker_logging(level: int, files: list[str]) -> None:
+    """
+    Logging of a spawned worker process, which starts unconfigured: same level
+    and format as the parent, appending to the parent's log files.
+    """
+    logging.basicConfig(
+        level=level,
+        format=LOG_FORMAT,
+        handlers=[logging.FileHandler(f, mode="a", encoding="utf-8") for f in files] + [logging.StreamHandler()],
+        force=True
+    )
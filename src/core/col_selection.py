@@ -1,8 +1,19 @@
 import polars as pl
 import src.infra.logger_wrapper as log
 
+from src.infra.stats_catalog import StatsCatalog
+
 @log.process_log
-def col_selection(df: pl.DataFrame) -> tuple[list[str], list[list[str]]]:
+def col_selection(
+    df: pl.DataFrame,
+    sample_frac: float | None = None,
+    approx: bool = False,
+    seed: int = 0,
+    return_profile: bool = False,
+    catalog: StatsCatalog | None = None,
+    exclude_degenerate_months: list[int] | None = None,
+    drop_features: set[str] | None = None
+) -> tuple[list[str], list[list[str]]] | tuple[list[str], list[list[str]], pl.DataFrame]:
     # Columns to drop
     col_drops = {
         "numero_de_cliente", "foto_mes", "active_quarter", "clase_ternaria",
@@ -11,14 +22,23 @@ def col_selection(df: pl.DataFrame) -> tuple[list[str], list[list[str]]]:
         "Visa_Fvencimiento", "Master_Fvencimiento"
     }
 
+    def compute_profile():
+        return profile_columns(df, sample_frac=sample_frac, approx=approx, seed=seed)
+
+    if catalog is not None:
+        profile_name = "profile" if sample_frac is None and not approx else f"profile_{sample_frac}_{approx}_{seed}"
+        profile = catalog.get_or_compute(profile_name, compute_profile)
+    else:
+        profile = compute_profile()
+    nunique = dict(zip(profile["column"], profile["n_unique"]))
+
     # --- Categorical vs Numerical ---
     cat_cols = []
     num_cols = []
     for c in df.columns:
         if c in col_drops:
             continue
-        nunique = df.select(pl.col(c).n_unique()).item()
-        if nunique <= 5:
+        if nunique[c] <= 5:
             cat_cols.append(c)
         else:
             num_cols.append(c)
@@ -40,4 +60,136 @@ def col_selection(df: pl.DataFrame) -> tuple[list[str], list[list[str]]]:
         if match:
             cols_ratios.append([match, c])
 
+    # --- Columns that are all zero/null in a month we are going to use ---
+    if exclude_degenerate_months:
+        if catalog is not None:
+            month_stats = catalog.get_or_compute("month_stats", lambda: profile_months(df))
+        else:
+            month_stats = profile_months(df)
+        degenerate = degenerate_columns(month_stats, exclude_degenerate_months)
+
+        cols_lag_delta_max_min_regl = [c for c in cols_lag_delta_max_min_regl if c not in degenerate]
+        cols_ratios = [pair for pair in cols_ratios if not set(pair) & degenerate]
+
+    # --- Features discarded by a previous run (ml/feature_pruning.py) ---
+    # The column list is shared by lag, delta, minmax and linreg, so it is
+    # pruned per family by feature_engineering_pipeline (prune_config): a
+    # family the models never saw must keep its columns.
+    if drop_features is not None:
+        cols_ratios = [pair for pair in cols_ratios if f"ratio_{pair[0]}_{pair[1]}" not in drop_features]
+
+    if return_profile:
+        return cols_lag_delta_max_min_regl, cols_ratios, profile
     return cols_lag_delta_max_min_regl, cols_ratios
+
+@log.process_log
+def profile_columns(
+    df: pl.DataFrame,
+    sample_frac: float | None = None,
+    approx: bool = False,
+    seed: int = 0
+) -> pl.DataFrame:
+    """
+    Profiles every column in a single query: cardinality, null share, min, max
+    and a constant flag.
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Panel de clientes
+    sample_frac : float | None
+        If set, the profile is computed on a deterministic sample of this fraction
+    approx : bool
+        Use approximate distinct counts (HyperLogLog) instead of exact ones
+    seed : int
+        Seed of the sample
+
+    Returns:
+    --------
+    pl.DataFrame
+        One row per column: column, n_unique, null_share, min, max, is_constant
+    """
+    if sample_frac is not None and sample_frac < 1:
+        df = df.sample(fraction=sample_frac, seed=seed)
+
+    numeric = {c for c, t in df.schema.items() if t.is_numeric()}
+
+    exprs = []
+    for i, c in enumerate(df.columns):
+        col = pl.col(c)
+        exprs.append((col.approx_n_unique() if approx else col.n_unique()).cast(pl.Int64).alias(f"n_unique_{i}"))
+        exprs.append(col.null_count().alias(f"null_count_{i}"))
+        if c in numeric:
+            exprs.append(col.min().cast(pl.Float64).alias(f"min_{i}"))
+            exprs.append(col.max().cast(pl.Float64).alias(f"max_{i}"))
+
+    stats = df.select(exprs).row(0, named=True) if exprs else {}
+    height = max(df.height, 1)
+
+    rows = []
+    for i, c in enumerate(df.columns):
+        n_unique = stats[f"n_unique_{i}"]
+        null_count = stats[f"null_count_{i}"]
+        # n_unique counts null as a value: constant means a single distinct value overall
+        rows.append({
+            "column": c,
+            "n_unique": n_unique,
+            "null_share": null_count / height,
+            "min": stats.get(f"min_{i}"),
+            "max": stats.get(f"max_{i}"),
+            "is_constant": n_unique <= 1,
+        })
+
+    return pl.DataFrame(rows, schema={
+        "column": pl.String,
+        "n_unique": pl.Int64,
+        "null_share": pl.Float64,
+        "min": pl.Float64,
+        "max": pl.Float64,
+        "is_constant": pl.Boolean,
+    })
+
+@log.process_log
+def profile_months(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Per-month statistics of every column in a single group_by pass.
+
+    Returns:
+    --------
+    pl.DataFrame
+        One row per (foto_mes, column): null_share and all_zero_or_null
+    """
+    columns = [c for c in df.columns if c != "foto_mes"]
+    numeric = {c for c, t in df.schema.items() if t.is_numeric()}
+
+    exprs = [pl.len().alias("__rows")]
+    for i, c in enumerate(columns):
+        exprs.append(pl.col(c).null_count().alias(f"null_count_{i}"))
+        if c in numeric:
+            exprs.append(((pl.col(c) == 0) | pl.col(c).is_null()).all().alias(f"zero_{i}"))
+        else:
+            exprs.append(pl.col(c).is_null().all().alias(f"zero_{i}"))
+
+    wide = df.group_by("foto_mes").agg(exprs).sort("foto_mes")
+
+    rows = []
+    for stats in wide.iter_rows(named=True):
+        for i, c in enumerate(columns):
+            rows.append({
+                "foto_mes": stats["foto_mes"],
+                "column": c,
+                "null_share": stats[f"null_count_{i}"] / stats["__rows"],
+                "all_zero_or_null": stats[f"zero_{i}"],
+            })
+
+    return pl.DataFrame(rows, schema={
+        "foto_mes": pl.Int64,
+        "column": pl.String,
+        "null_share": pl.Float64,
+        "all_zero_or_null": pl.Boolean,
+    })
+
+def degenerate_columns(month_stats: pl.DataFrame, months: list[int]) -> set[str]:
+    """Columns that are entirely zero or null in at least one of 'months'."""
+    flagged = month_stats.filter(pl.col("foto_mes").is_in(months) & pl.col("all_zero_or_null"))
+    return set(flagged["column"].to_list())
@@ -0,0 +1,127 @@
+import polars as pl
+import logging
+import src.infra.logger_wrapper as log
+
+logger = logging.getLogger(__name__)
+
+SIGNED_RANGES = [
+    (pl.Int8, -2**7, 2**7 - 1),
+    (pl.Int16, -2**15, 2**15 - 1),
+    (pl.Int32, -2**31, 2**31 - 1),
+]
+UNSIGNED_RANGES = [
+    (pl.UInt8, 0, 2**8 - 1),
+    (pl.UInt16, 0, 2**16 - 1),
+    (pl.UInt32, 0, 2**32 - 1),
+]
+INT_BYTES = {
+    pl.Int8: 1, pl.Int16: 2, pl.Int32: 4, pl.Int64: 8,
+    pl.UInt8: 1, pl.UInt16: 2, pl.UInt32: 4, pl.UInt64: 8,
+}
+# Signed type that holds the difference of any two values of the key type
+WIDER_FOR_SUBTRACTION = {
+    pl.Int8: pl.Int16, pl.Int16: pl.Int32, pl.Int32: pl.Int64,
+    pl.UInt8: pl.Int16, pl.UInt16: pl.Int32, pl.UInt32: pl.Int64,
+}
+KEY_COLUMNS = ("numero_de_cliente", "foto_mes")
+INT_DTYPES = set(INT_BYTES)
+
+@log.process_log
+def compact_dtypes(
+    df: pl.DataFrame,
+    floats: bool = True,
+    exclude: tuple[str, ...] = KEY_COLUMNS
+) -> pl.DataFrame:
+    """
+    Reduce cada columna al tipo más chico que alcanza para sus valores
+
+    - Enteros: Int8/16/32 (UInt8/16/32 si eran sin signo) según el rango
+      observado (min/max en una sola pasada)
+    - Flotantes: Float64 -> Float32 (LightGBM discretiza en max_bin bins, la
+      precisión extra no cambia los splits)
+    - clase_ternaria: Categorical
+
+    Los enteros conservan el signo y nunca pasan a un tipo más ancho que el
+    original (un UInt8 queda UInt8). Se corre sobre el panel crudo, antes del
+    feature engineering, con floats=False: los enteros se achican sin perder
+    nada y los lags heredan el tipo chico. DuckDB no promueve tipos chicos en
+    la resta, así que feature_engineering_pipeline ensancha (ver
+    widen_for_subtraction) solo las columnas de los deltas. Después del
+    feature engineering se corre de nuevo para bajar los Float64 generados.
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Panel de clientes
+    floats : bool
+        Si se bajan los Float64 a Float32
+    exclude : tuple[str, ...]
+        Columnas que no se tocan (por defecto las claves)
+
+    Returns:
+    --------
+    pl.DataFrame
+        DataFrame con los tipos compactados
+    """
+    size_before = df.estimated_size("mb")
+
+    int_cols = [c for c, t in df.schema.items() if t in INT_DTYPES and c not in exclude]
+    bounds = {}
+    if int_cols:
+        stats = df.select(
+            [pl.col(c).min().alias(f"{c}__min") for c in int_cols] +
+            [pl.col(c).max().alias(f"{c}__max") for c in int_cols]
+        ).row(0, named=True)
+        bounds = {c: (stats[f"{c}__min"], stats[f"{c}__max"]) for c in int_cols}
+
+    casts = []
+    for c, dtype in df.schema.items():
+        if c in exclude:
+            continue
+        if c == "clase_ternaria" and dtype == pl.String:
+            casts.append(pl.col(c).cast(pl.Categorical))
+        elif c in bounds:
+            target = _narrowest_int(*bounds[c], dtype)
+            if target is not None:
+                casts.append(pl.col(c).cast(target))
+        elif floats and dtype == pl.Float64:
+            casts.append(pl.col(c).cast(pl.Float32))
+
+    if casts:
+        df = df.with_columns(casts)
+
+    size_after = df.estimated_size("mb")
+    logger.info(
+        f"Compacted {len(casts)} columns: {size_before:.1f} MB -> {size_after:.1f} MB "
+        f"({size_before - size_after:.1f} MB saved)"
+    )
+
+    return df
+
+def widen_for_subtraction(df: pl.DataFrame, columns: list[str]) -> tuple[pl.DataFrame, dict[str, pl.DataType]]:
+    """
+    Casts the compacted integer columns of 'columns' to the next signed type
+    (Int8 -> Int16, UInt8 -> Int16...), where 'col - lag(col)' cannot overflow.
+
+    Returns:
+    --------
+    tuple[pl.DataFrame, dict[str, pl.DataType]]
+        The frame and the original dtype of every widened column, to cast the
+        base columns back once the deltas are computed
+    """
+    original = {c: df.schema[c] for c in columns if df.schema.get(c) in WIDER_FOR_SUBTRACTION}
+    if original:
+        df = df.with_columns([pl.col(c).cast(WIDER_FOR_SUBTRACTION[t]) for c, t in original.items()])
+    return df, original
+
+def _narrowest_int(min_value, max_value, source: pl.DataType) -> pl.DataType | None:
+    """Smallest type of the same signedness as 'source' that holds the range, if narrower than 'source'."""
+    ranges = UNSIGNED_RANGES if source in (pl.UInt8, pl.UInt16, pl.UInt32, pl.UInt64) else SIGNED_RANGES
+
+    for dtype, low, high in ranges:
+        if INT_BYTES[dtype] >= INT_BYTES[source]:
+            return None
+        # All-null column: nothing to measure, smallest type holds the nulls
+        if min_value is None or max_value is None or (low <= min_value and max_value <= high):
+            return dtype
+    return None
@@ -1,10 +1,40 @@
 import polars as pl
+import logging
+import os
+import json
+import hashlib
+import tempfile
 import src.infra.logger_wrapper as log
+import src.infra.loader_utils as lu
+import src.infra.dataset_store as ds
+import src.core.dtype_compaction as dc
 
-from src.infra.duckdb_runner import run_duckdb_query
+from src.infra.duckdb_runner import run_duckdb_queries, run_duckdb_query_bucketed
+from src.core.feature_engineering_polars import run_features_polars
+from src.core.panel import run_features_numpy
+from src.core.sorted_panel import SortedPanel
+from src.core.trend import linreg_windows, linreg_stats, rolling_trend
+
+logger = logging.getLogger(__name__)
+
+KEYS = ["numero_de_cliente", "foto_mes"]
+
+# Bump when the generated features change so cached matrices are not reused
+FEATURE_CACHE_VERSION = 6
 
 @log.process_log
-def feature_engineering_pipeline(df: pl.DataFrame, config: dict) -> pl.DataFrame:
+def feature_engineering_pipeline(
+    df: pl.DataFrame,
+    config: dict,
+    cache_dir: str | None = None,
+    n_buckets: int = 1,
+    n_jobs: int = 1,
+    spill_dir: str | None = None,
+    engine: str = "duckdb",
+    max_columns: int | None = None,
+    output_months: list[int] | None = None,
+    drop_features: set[str] | None = None
+) -> pl.DataFrame:
     """
     Ejecuta el pipeline de feature engineering completo
 
@@ -31,8 +61,42 @@ def feature_engineering_pipeline(df: pl.DataFrame, config: dict) -> pl.DataFrame
         },
         "linreg": {
             "columns": ["col1"],
-            "window": 3  # optional, for flexibility
+            "window": 3,  # optional, for flexibility
+            # or "windows": [3, 6] -> slope_col1_w3, slope_col1_w6
+            "stats": ["slope"],  # optional: "slope", "intercept", "r2"
+            "method": "trend"  # optional: "trend" (running sums) or "sql" (REGR_*)
         }
+    cache_dir : str | None
+        Si se indica, el resultado se guarda en Parquet bajo una clave que
+        combina el contenido de 'df' y 'config'. Una corrida con los mismos
+        datos y la misma configuración lee el resultado en vez de recalcularlo.
+    n_buckets : int
+        Si es mayor a 1, la query se ejecuta por buckets de numero_de_cliente
+        (hash) y cada resultado parcial va a disco. Todas las ventanas son por
+        cliente, así que el resultado es el mismo con memoria acotada a un bucket
+    n_jobs : int
+        Buckets (o, sin buckets, grupos de columnas) que se ejecutan en paralelo
+    spill_dir : str | None
+        Carpeta donde van los archivos de los buckets mientras se ejecuta la
+        query (la temporal del sistema si es None); se borran al terminar
+    engine : str
+        "duckdb" (SQL generado por add_*_sql), "polars" (expresiones lazy de
+        feature_engineering_polars) o "numpy" (shifts de arreglos sobre el
+        SortedPanel de sorted_panel.py). Los buckets solo aplican a "duckdb"
+    max_columns : int | None
+        Solo "duckdb": máximo de features por query. Un SELECT muy ancho se
+        parte en grupos de columnas que se ejecutan por separado y se unen
+        por posición (ordenados por numero_de_cliente, foto_mes)
+    output_months : list[int] | None
+        Si se indica, solo se devuelven las filas de estos foto_mes y el
+        cálculo usa únicamente las filas de lookback que necesitan las
+        ventanas (ver prune_to_lookback). El resultado es el mismo que el de
+        la historia completa filtrado a esos meses
+    drop_features : set[str] | None
+        Features descartadas por la poda (ver ml/feature_pruning.py): las que
+        los modelos vieron y no pasaron el corte. No se generan; las features
+        que los modelos no vieron (otra familia, otra columna) se generan
+        igual, y las columnas del panel de entrada no se tocan
 
     Returns:
     --------
@@ -40,70 +104,336 @@ def feature_engineering_pipeline(df: pl.DataFrame, config: dict) -> pl.DataFrame
         DataFrame con las nuevas features agregadas
     """
 
-    sql = "SELECT *"
+    if drop_features is not None:
+        config = prune_config(config, drop_features)
 
-    window_clause = ""
+    if output_months is not None:
+        df = prune_to_lookback(df, config, output_months)
 
-    if "lag" in config:
-        sql += add_lag_sql(config["lag"])
+    if cache_dir is not None:
+        key = features_key(df, config, engine, output_months=output_months, drop_features=drop_features)
+        cache_path = os.path.join(os.path.expanduser(cache_dir), f"features_{key}.parquet")
+        if os.path.exists(cache_path):
+            logger.info(f"Feature cache hit: '{cache_path}'")
+            return pl.read_parquet(cache_path)
 
-    if "delta" in config:
-        sql += add_delta_sql(config["delta"])
+    df = _compute_features(df, config, engine, n_buckets=n_buckets, n_jobs=n_jobs, spill_dir=spill_dir, max_columns=max_columns)
+
+    if output_months is not None:
+        df = df.filter(pl.col("foto_mes").is_in(output_months))
+
+    if drop_features is not None:
+        # Families are generated per column: drop the siblings that were pruned
+        df = df.drop([c for c in feature_columns_sql(config) if c in drop_features])
+
+    if cache_dir is not None:
+        lu.ensure_dirs(os.path.expanduser(cache_dir))
+        df.write_parquet(cache_path + ".tmp")
+        os.replace(cache_path + ".tmp", cache_path)
+        logger.info(f"Feature matrix cached at '{cache_path}'")
+
+    return df
 
+def required_lookback(config: dict) -> int | None:
+    """
+    Cantidad de filas previas por cliente que necesitan las ventanas de 'config'.
+    None significa historia completa (minmax usa toda la partición del cliente).
+    """
     if "minmax" in config:
-        sql += add_minmax_sql(config["minmax"])
-    
-    if "ratio" in config:
-        sql += add_ratio_sql(config["ratio"])
+        return None
 
+    lookback = 0
+    if "lag" in config:
+        lookback = max(lookback, config["lag"]["n"])
+    if "delta" in config:
+        lookback = max(lookback, config["delta"]["n"])
     if "linreg" in config:
-        linreg_str, window_clause = add_linreg_sql(config["linreg"])
-        sql += linreg_str
+        lookback = max([lookback] + [w for w, _ in linreg_windows(config["linreg"])])
+    return lookback
 
-    sql += " FROM df"
-    if window_clause != "":
-        sql += window_clause
+def prune_config(config: dict, drop_features: set[str]) -> dict:
+    """
+    Restringe cada familia de 'config' a las columnas (o pares de ratio) con
+    al menos una feature fuera de 'drop_features'. Las familias que quedan
+    vacías se quitan.
+    """
+    builders = {"lag": add_lag_sql, "delta": add_delta_sql, "minmax": add_minmax_sql, "ratio": add_ratio_sql, "linreg": add_linreg_sql}
 
-    df = run_duckdb_query(df, sql)
+    pruned = {}
+    for family, family_config in config.items():
+        kept = {source for source, alias, _ in builders[family](family_config) if alias not in drop_features}
+        if family == "ratio":
+            pairs = [pair for pair in family_config["pairs"] if f"ratio_{pair[0]}_{pair[1]}" in kept]
+            if pairs:
+                pruned[family] = {**family_config, "pairs": pairs}
+        else:
+            columns = [col for col in family_config["columns"] if col in kept]
+            if columns:
+                pruned[family] = {**family_config, "columns": columns}
 
+    before, after = len(feature_columns_sql(config)), len(feature_columns_sql(pruned))
+    logger.info(f"Feature pruning: {after} of {before} features kept")
+    return pruned
+
+def prune_to_lookback(df: pl.DataFrame | pl.LazyFrame, config: dict, months: list[int]) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Filas de 'months' y, por cliente, las 'lookback' filas anteriores a cada
+    una de ellas (ver required_lookback). Los lags y ventanas cuentan filas
+    del cliente, no meses: si el cliente tiene un hueco, el lookback llega a
+    una fila más vieja, igual que sobre la historia completa. Acepta un
+    DataFrame o un LazyFrame (el filtro se agrega al plan).
+    """
+    lookback = required_lookback(config)
+    if lookback is None:
+        logger.warning("minmax needs the full customer history: every month is read")
+        return df
+
+    pruned = lu.rows_with_lookback(df, months, lookback)
+
+    if isinstance(df, pl.DataFrame):
+        logger.info(f"Lookback pruning: {pruned.height:,} of {df.height:,} rows ({lookback} rows per customer before {sorted(set(months))})")
+    return pruned
+
+@log.process_log
+def feature_engineering_incremental(df: pl.DataFrame, config: dict, new_month: int) -> pl.DataFrame:
+    """
+    Calcula las features solo para 'new_month', usando únicamente las filas de
+    lookback de cada cliente que necesitan las ventanas (ver
+    prune_to_lookback). El resultado es el mismo que el de la historia
+    completa filtrado a 'new_month'.
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Panel (puede ser la historia completa, se poda acá)
+    config : dict
+        Misma configuración que feature_engineering_pipeline
+    new_month : int
+        foto_mes a calcular
+
+    Returns:
+    --------
+    pl.DataFrame
+        Filas de 'new_month' con las features agregadas
+    """
+    df = prune_to_lookback(df, config, [new_month])
+    return _compute_features(df, config).filter(pl.col("foto_mes") == new_month)
+
+def append_month_features(source_root: str, feature_root: str, config: dict, new_month: int) -> pl.DataFrame:
+    """
+    Lee del store de datos solo las filas de lookback de 'new_month' (ver
+    load_data), calcula sus features y las agrega como una partición nueva
+    al store de features.
+    """
+    lookback = required_lookback(config)
+    if lookback is None:
+        df = lu.load_data(source_root, "store")
+    else:
+        df = lu.load_data(source_root, "store", months=[new_month], lookback=lookback)
+
+    features = feature_engineering_incremental(df, config, new_month)
+    ds.write_partition(features, feature_root, new_month)
+    logger.info(f"Features of {new_month} appended to '{feature_root}'")
+
+    return features
+
+def features_key(
+    df: pl.DataFrame,
+    config: dict,
+    engine: str = "duckdb",
+    output_months: list[int] | None = None,
+    drop_features: set[str] | None = None
+) -> str:
+    """Content address of a feature matrix: input data fingerprint + config + engine (+ output months, pruning)."""
+    digest = hashlib.sha256()
+    digest.update(f"{FEATURE_CACHE_VERSION}:{engine}".encode())
+    digest.update(lu.frame_fingerprint(df).encode())
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+    if output_months is not None:
+        digest.update(json.dumps(sorted(set(output_months))).encode())
+    if drop_features is not None:
+        digest.update(json.dumps(sorted(c for c in feature_columns_sql(config) if c not in drop_features)).encode())
+    return digest.hexdigest()
+
+def _compute_features(df: pl.DataFrame, config: dict, engine: str = "duckdb", **duckdb_kwargs) -> pl.DataFrame:
+    # Deltas of compacted integer columns would overflow in the subtraction
+    widened = {}
+    if "delta" in config:
+        df, widened = dc.widen_for_subtraction(df, config["delta"]["columns"])
+
+    if engine == "polars":
+        df = run_features_polars(df, config)
+    elif engine == "numpy":
+        df = run_features_numpy(df, config)
+    elif engine == "duckdb":
+        df = _run_features(df, config, **duckdb_kwargs)
+    else:
+        raise ValueError(f"Unsupported feature engine: '{engine}'")
+
+    if widened:
+        # The base columns, their lags and MIN/MAX hold original values: back to the small type
+        n_lags = config.get("lag", {}).get("n", 0)
+        restore = {
+            name: dtype
+            for c, dtype in widened.items()
+            for name in [c, f"{c}_MAX", f"{c}_MIN"] + [f"{c}_lag_{i}" for i in range(1, n_lags + 1)]
+            if name in df.columns
+        }
+        df = df.with_columns([pl.col(c).cast(dtype) for c, dtype in restore.items()])
     return df
 
-def add_lag_sql(config_lag: dict) -> str:    
-    lag_str = ""
-    for col in config_lag["columns"]:
-        for i in range(1, config_lag["n"] + 1):
-            lag_str += f", lag({col}, {i}) OVER (PARTITION BY numero_de_cliente ORDER BY foto_mes) AS {col}_lag_{i}"
+def _run_features(
+    df: pl.DataFrame,
+    config: dict,
+    n_buckets: int = 1,
+    n_jobs: int = 1,
+    spill_dir: str | None = None,
+    max_columns: int | None = None
+) -> pl.DataFrame:
+    trend_in_numpy = "linreg" in config and config["linreg"].get("method", "trend") == "trend"
+    sql_config = {k: v for k, v in config.items() if not (k == "linreg" and trend_in_numpy)}
+    statements = plan_features_sql(sql_config, max_columns=max_columns)
+
+    if n_buckets > 1:
+        # The pipeline returns a DataFrame, so the bucket files are read back
+        # here and removed afterwards
+        if spill_dir is not None:
+            lu.ensure_dirs(os.path.expanduser(spill_dir))
+        with tempfile.TemporaryDirectory(prefix="feature_buckets_", dir=spill_dir and os.path.expanduser(spill_dir)) as folder:
+            parts = [
+                pl.scan_parquet(run_duckdb_query_bucketed(df, sql, n_buckets, os.path.join(folder, f"query_{n}"), n_jobs=n_jobs)).collect()
+                for n, sql in enumerate(statements)
+            ]
+    else:
+        parts = run_duckdb_queries(df, statements, n_jobs=n_jobs)
+
+    if len(statements) == 1:
+        result = parts[0]
+    else:
+        # Column groups are joined positionally: with one row per
+        # (numero_de_cliente, foto_mes), sorting by the keys aligns them
+        if df.select(KEYS).is_duplicated().any():
+            raise ValueError("Duplicated (numero_de_cliente, foto_mes) keys: column groups cannot be aligned")
+
+        parts = [part.sort(KEYS) for part in parts]
+        logger.info(f"Feature query split in {len(statements)} column groups")
+
+        keys = parts[0].select(KEYS)
+        for n, part in enumerate(parts[1:], start=1):
+            if not part.select(KEYS).equals(keys):
+                raise ValueError(f"Feature column group {n} is not aligned with the first one")
+
+        result = parts[0].hstack([s for part in parts[1:] for s in part.drop(KEYS)])
+        result = result.select(df.columns + feature_columns_sql(sql_config))
+
+    if trend_in_numpy:
+        # REGR_* over a window frame is the slowest part of the query: the
+        # trend engine computes every window from running sums instead
+        panel = SortedPanel(result)
+        result = panel.df.hstack(rolling_trend(panel, config["linreg"]))
+
+    return result
+
+def plan_features_sql(config: dict, max_columns: int | None = None) -> list[str]:
+    """
+    Arma las queries del feature engineering.
+
+    Las features de una misma columna forman un bloque, así un delta queda
+    en la misma query que el lag que reutiliza. Los frames de ventana son
+    ventanas con nombre (WINDOW) compartidas por todas las expresiones. Con
+    'max_columns' los bloques se reparten en grupos de a lo sumo esa cantidad
+    de features (salvo un bloque más grande), una query por grupo.
+    """
+    blocks = {}
+    for position, (source, alias, expr) in enumerate(_plan_features(config)):
+        blocks.setdefault(source, []).append((position, alias, expr))
+
+    groups = [[]]
+    for block in blocks.values():
+        if max_columns is not None and groups[-1] and len(groups[-1]) + len(block) > max_columns:
+            groups.append([])
+        groups[-1].extend(block)
+
+    windows = _feature_windows(config)
+    statements = []
+    for n, group in enumerate(groups):
+        # Inside a query the features keep the usual order (lags, deltas, ...)
+        features = [(alias, expr) for _, alias, expr in sorted(group)]
+        select = "SELECT *" if n == 0 else f"SELECT {', '.join(KEYS)}"
+        sql = select + "".join(f", {expr} AS {alias}" for alias, expr in features) + " FROM df"
+
+        used = [w for w in windows if any(expr.endswith(f"OVER {w}") for _, expr in features)]
+        if used:
+            sql += " WINDOW " + ", ".join(f"{w} AS ({windows[w]})" for w in used)
+        statements.append(sql)
+
+    return statements
+
+def feature_columns_sql(config: dict) -> list[str]:
+    """Nombres de las features que genera 'config', en el orden del SELECT."""
+    return [alias for _, alias, _ in _plan_features(config)]
+
+def _plan_features(config: dict) -> list[tuple[str, str, str]]:
+    """(columna de origen, alias, expresión) de cada feature."""
+    features = []
+    if "lag" in config:
+        features += add_lag_sql(config["lag"])
+    if "delta" in config:
+        features += add_delta_sql(config["delta"], lags={alias for _, alias, _ in features})
+    if "minmax" in config:
+        features += add_minmax_sql(config["minmax"])
+    if "ratio" in config:
+        features += add_ratio_sql(config["ratio"])
+    if "linreg" in config:
+        features += add_linreg_sql(config["linreg"])
+    return features
+
+def _feature_windows(config: dict) -> dict[str, str]:
+    windows = {
+        "ventana_cliente": "PARTITION BY numero_de_cliente ORDER BY foto_mes",
+        "ventana_cliente_total": "PARTITION BY numero_de_cliente",
+    }
+    if "linreg" in config:
+        for window_size, _ in linreg_windows(config["linreg"]):
+            windows[f"ventana_{window_size}"] = f"PARTITION BY numero_de_cliente ORDER BY foto_mes ROWS BETWEEN {window_size} PRECEDING AND CURRENT ROW"
+    return windows
 
-    return lag_str
+def add_lag_sql(config_lag: dict) -> list[tuple[str, str, str]]:
+    return [
+        (col, f"{col}_lag_{i}", f"lag({col}, {i}) OVER ventana_cliente")
+        for col in config_lag["columns"]
+        for i in range(1, config_lag["n"] + 1)
+    ]
 
-def add_delta_sql(config_delta: dict) -> str:
-    delta_str = ""
+def add_delta_sql(config_delta: dict, lags: set[str] = frozenset()) -> list[tuple[str, str, str]]:
+    """Deltas sobre el lag ya calculado si está en 'lags', si no con su propio lag()."""
+    delta_sql = []
     for col in config_delta["columns"]:
         for i in range(1, config_delta["n"] + 1):
-            delta_str += f", {col} - {col}_lag_{i} AS {col}_delta_{i}"
+            lag = f"{col}_lag_{i}"
+            expr = f"{col} - {lag}" if lag in lags else f"{col} - lag({col}, {i}) OVER ventana_cliente"
+            delta_sql.append((col, f"{col}_delta_{i}", expr))
+    return delta_sql
 
-    return delta_str
-
-def add_minmax_sql(config_minmax: dict) -> str:
-    min_max_sql = ""
+def add_minmax_sql(config_minmax: dict) -> list[tuple[str, str, str]]:
+    min_max_sql = []
     for col in config_minmax["columns"]:
-        min_max_sql += f", MAX({col}) OVER (PARTITION BY numero_de_cliente) AS {col}_MAX, MIN({col}) OVER (PARTITION BY numero_de_cliente) AS {col}_MIN"
-
+        min_max_sql.append((col, f"{col}_MAX", f"MAX({col}) OVER ventana_cliente_total"))
+        min_max_sql.append((col, f"{col}_MIN", f"MIN({col}) OVER ventana_cliente_total"))
     return min_max_sql
 
-def add_ratio_sql(config_ratio: dict) -> str:
-    ratio_sql = ""
+def add_ratio_sql(config_ratio: dict) -> list[tuple[str, str, str]]:
+    ratio_sql = []
     for pair in config_ratio["pairs"]:
-        ratio_sql += f", IF({pair[1]} = 0, 0, {pair[0]} / {pair[1]}) AS ratio_{pair[0]}_{pair[1]}"
-
+        alias = f"ratio_{pair[0]}_{pair[1]}"
+        ratio_sql.append((alias, alias, f"IF({pair[1]} = 0, 0, {pair[0]} / {pair[1]})"))
     return ratio_sql
 
-def add_linreg_sql(config_linreg: dict) -> tuple:
-    linreg_sql = ""
-    window_size = config_linreg.get("window", 3)
+def add_linreg_sql(config_linreg: dict) -> list[tuple[str, str, str]]:
+    linreg_sql = []
+    functions = {"slope": "REGR_SLOPE", "intercept": "REGR_INTERCEPT", "r2": "REGR_R2"}
     for col in config_linreg["columns"]:
-        linreg_sql += f", REGR_SLOPE({col}, cliente_antiguedad) OVER ventana_{window_size} AS slope_{col}"
-    
-    window_clause = f" WINDOW ventana_{window_size} AS (PARTITION BY numero_de_cliente ORDER BY foto_mes ROWS BETWEEN {window_size} PRECEDING AND CURRENT ROW)"
-
-    return linreg_sql, window_clause
\ No newline at end of file
+        for window_size, suffix in linreg_windows(config_linreg):
+            for stat in linreg_stats(config_linreg):
+                linreg_sql.append((col, f"{stat}_{col}{suffix}", f"{functions[stat]}({col}, cliente_antiguedad) OVER ventana_{window_size}"))
+    return linreg_sql
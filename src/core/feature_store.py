@@ -0,0 +1,154 @@
+import polars as pl
+import logging
+import os
+import json
+import hashlib
+import src.infra.logger_wrapper as log
+import src.infra.loader_utils as lu
+
+from src.core.feature_engineering import FEATURE_CACHE_VERSION, KEYS, feature_columns_sql, feature_engineering_pipeline
+
+logger = logging.getLogger(__name__)
+
+# Feature families in the order feature_engineering_pipeline adds them
+FAMILIES = ("lag", "delta", "minmax", "ratio", "linreg")
+
+class FeatureStore:
+    """
+    Each feature family ("lag", "delta", "minmax", "ratio", "linreg") of a
+    dataset materialized once in its own Parquet file, with only the family's
+    columns and the rows sorted by (numero_de_cliente, foto_mes).
+
+    The training matrix is the base panel plus a projection over the chosen
+    families, so toggling a family on or off reads its file instead of
+    recomputing every feature.
+
+    Layout: <root>/<family>_<key>.parquet, where the key combines the dataset
+    fingerprint, the family config, the engine, the output months and the
+    pruned feature list (see ml/feature_pruning.py).
+    """
+
+    def __init__(
+        self,
+        root: str,
+        df: pl.DataFrame,
+        engine: str = "duckdb",
+        output_months: list[int] | None = None,
+        drop_features: set[str] | None = None,
+        **pipeline_kwargs
+    ):
+        self.root = os.path.expanduser(root)
+        self.df = df
+        self.engine = engine
+        self.output_months = output_months
+        self.drop_features = drop_features
+        self.pipeline_kwargs = pipeline_kwargs
+        self.fingerprint = lu.frame_fingerprint(df)
+
+    def family_path(self, family: str, family_config: dict) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{FEATURE_CACHE_VERSION}:{self.engine}:{family}".encode())
+        digest.update(self.fingerprint.encode())
+        digest.update(json.dumps(family_config, sort_keys=True, default=str).encode())
+        if self.output_months is not None:
+            digest.update(json.dumps(sorted(set(self.output_months))).encode())
+        if self.drop_features is not None:
+            generated = feature_columns_sql({family: family_config})
+            digest.update(json.dumps(sorted(c for c in generated if c not in self.drop_features)).encode())
+        return os.path.join(self.root, f"{family}_{digest.hexdigest()}.parquet")
+
+    def materialize(self, family: str, family_config: dict) -> str:
+        """Computes and writes a family unless it is already stored. Returns its path."""
+        if family not in FAMILIES:
+            raise ValueError(f"Unsupported feature family: '{family}'")
+
+        path = self.family_path(family, family_config)
+        if os.path.exists(path):
+            logger.info(f"Feature family '{family}' found at '{path}'")
+            return path
+
+        # Only the columns the family reads: the base panel is not copied per family
+        sources = family_sources(family, family_config)
+        projected = self.df.select([c for c in dict.fromkeys(KEYS + ["cliente_antiguedad"] + sources) if c in self.df.columns])
+
+        features = feature_engineering_pipeline(
+            projected,
+            {family: family_config},
+            engine=self.engine,
+            output_months=self.output_months,
+            drop_features=self.drop_features,
+            **self.pipeline_kwargs
+        )
+        new_columns = [c for c in features.columns if c not in projected.columns]
+
+        lu.ensure_dirs(self.root)
+        features.select(KEYS + new_columns).sort(KEYS).write_parquet(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        logger.info(f"Feature family '{family}' materialized at '{path}' ({len(new_columns)} columns)")
+
+        return path
+
+    @log.process_log
+    def assemble(self, config: dict, columns: dict[str, list[str]] | None = None) -> pl.DataFrame:
+        """
+        Base panel with the features of every family in 'config' (same config
+        format as feature_engineering_pipeline), materializing the missing ones.
+
+        Parameters:
+        -----------
+        config : dict
+            Families to include and their configuration
+        columns : dict[str, list[str]] | None
+            Optional per-family column projection ({"lag": ["mcaja_ahorro_lag_1"]})
+
+        Returns:
+        --------
+        pl.DataFrame
+            Base columns followed by the family columns, sorted by
+            (numero_de_cliente, foto_mes)
+        """
+        base = self.df
+        if self.output_months is not None:
+            base = base.filter(pl.col("foto_mes").is_in(self.output_months))
+        base = base.sort(KEYS)
+        keys = base.select(KEYS)
+
+        for family in FAMILIES:
+            if family not in config:
+                continue
+
+            path = self.materialize(family, config[family])
+            selected = None
+            if columns is not None and family in columns:
+                selected = KEYS + list(columns[family])
+
+            part = pl.read_parquet(path, columns=selected)
+            # Positional join: every family file holds the same sorted keys
+            if not part.select(KEYS).equals(keys):
+                raise ValueError(f"Feature family '{family}' at '{path}' is not aligned with the base panel")
+
+            base = base.hstack(part.drop(KEYS).get_columns())
+
+        return base
+
+def family_sources(family: str, family_config: dict) -> list[str]:
+    """Base columns a family reads (the ratio pairs, or its 'columns')."""
+    if family == "ratio":
+        return [col for pair in family_config["pairs"] for col in pair]
+    return list(family_config["columns"])
+
+def assemble_features(
+    df: pl.DataFrame,
+    config: dict,
+    store_dir: str,
+    engine: str = "duckdb",
+    output_months: list[int] | None = None,
+    drop_features: set[str] | None = None,
+    **pipeline_kwargs
+) -> pl.DataFrame:
+    """
+    Same result as feature_engineering_pipeline(df, config, ...), assembled
+    from the per-family files in 'store_dir' (see FeatureStore).
+    """
+    store = FeatureStore(store_dir, df, engine=engine, output_months=output_months, drop_features=drop_features, **pipeline_kwargs)
+    return store.assemble(config)
@@ -0,0 +1,82 @@
+import polars as pl
+import numpy as np
+import src.infra.logger_wrapper as log
+
+from src.core.sorted_panel import SortedPanel, to_series
+from src.core.trend import rolling_trend
+
+@log.process_log
+def run_features_numpy(df: pl.DataFrame, config: dict) -> pl.DataFrame:
+    """
+    Backend NumPy del feature engineering sobre un SortedPanel: mismas features
+    y nombres que el SQL de feature_engineering.py. El resultado sale ordenado
+    por (numero_de_cliente, foto_mes).
+    """
+    panel = SortedPanel(df)
+    series = []
+
+    if "lag" in config:
+        series += add_lag_arrays(panel, config["lag"])
+
+    if "delta" in config:
+        series += add_delta_arrays(panel, config["delta"])
+
+    if "minmax" in config:
+        series += add_minmax_arrays(panel, config["minmax"])
+
+    if "ratio" in config:
+        series += add_ratio_arrays(panel, config["ratio"])
+
+    if "linreg" in config:
+        series += add_linreg_arrays(panel, config["linreg"])
+
+    return panel.df.hstack(series)
+
+def add_lag_arrays(panel: SortedPanel, config_lag: dict) -> list[pl.Series]:
+    series = []
+    for col in config_lag["columns"]:
+        values, valid = panel.column(col)
+        dtype = panel.df.schema[col]
+        for i in range(1, config_lag["n"] + 1):
+            lag, lag_valid = panel.shift(values, valid, i)
+            series.append(to_series(f"{col}_lag_{i}", lag, lag_valid, dtype))
+    return series
+
+def add_delta_arrays(panel: SortedPanel, config_delta: dict) -> list[pl.Series]:
+    series = []
+    for col in config_delta["columns"]:
+        values, valid = panel.column(col)
+        dtype = panel.df.schema[col]
+        for i in range(1, config_delta["n"] + 1):
+            lag, lag_valid = panel.shift(values, valid, i)
+            series.append(to_series(f"{col}_delta_{i}", values - lag, valid & lag_valid, dtype))
+    return series
+
+def add_minmax_arrays(panel: SortedPanel, config_minmax: dict) -> list[pl.Series]:
+    series = []
+    for col in config_minmax["columns"]:
+        values, valid = panel.column(col)
+        dtype = panel.df.schema[col]
+        for op, suffix in (("max", "MAX"), ("min", "MIN")):
+            reduced, reduced_valid = panel.group_reduce(values, valid, op)
+            series.append(to_series(f"{col}_{suffix}", reduced, reduced_valid, dtype))
+    return series
+
+def add_ratio_arrays(panel: SortedPanel, config_ratio: dict) -> list[pl.Series]:
+    series = []
+    for pair in config_ratio["pairs"]:
+        num, num_valid = panel.column(pair[0])
+        den, den_valid = panel.column(pair[1])
+        is_zero = den_valid & (den == 0)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(is_zero, 0.0, num.astype(np.float64) / np.where(is_zero, 1, den))
+
+        # IF(den = 0, 0, num / den): a zero denominator wins even over a null numerator
+        valid = is_zero | (num_valid & den_valid)
+        series.append(to_series(f"ratio_{pair[0]}_{pair[1]}", ratio, valid, pl.Float64))
+    return series
+
+def add_linreg_arrays(panel: SortedPanel, config_linreg: dict, x_col: str = "cliente_antiguedad") -> list[pl.Series]:
+    """REGR_SLOPE/INTERCEPT/R2(col, x) por ventana, vía el motor de tendencias."""
+    return rolling_trend(panel, config_linreg, x_col)
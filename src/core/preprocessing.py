@@ -3,24 +3,63 @@ import pandas as pd
 import numpy as np
 import src.infra.logger_wrapper as log
 
+from dataclasses import dataclass
+
+@dataclass
+class FeatureMatrix:
+    """
+    Feature matrix handed to LightGBM without a pandas intermediate: a
+    Fortran-ordered float32 array (LightGBM reads it without copying), the
+    column names, and numero_de_cliente kept apart as integers for the
+    submission (float32 cannot represent every customer id exactly).
+    """
+    X: np.ndarray
+    feature_names: list[str]
+    numero_de_cliente: np.ndarray
+
+    @classmethod
+    def from_polars(cls, df: pl.DataFrame) -> "FeatureMatrix":
+        # Filled column by column: peak memory is one float32 matrix plus a single column
+        X = np.empty((df.height, df.width), dtype=np.float32, order="F")
+        for j, s in enumerate(df.iter_columns()):
+            X[:, j] = s.cast(pl.Float32).to_numpy()
+        return cls(X, df.columns, df["numero_de_cliente"].to_numpy())
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+    def ids(self) -> pd.DataFrame:
+        """numero_de_cliente as a one-column frame, to build the submission."""
+        return pd.DataFrame({"numero_de_cliente": self.numero_de_cliente})
+
 @log.process_log
 def preprocessing_pipeline(
     df: pl.DataFrame,
     positives: list[str],
     month_train: list[int],
-    month_test: int
+    month_test: int,
+    output: str = "pandas"
 ) -> tuple[
-    pd.DataFrame,        # X_train
-    np.ndarray,          # y_train_binary
-    np.ndarray,          # w_train
-    pd.DataFrame,        # X_test
-    np.ndarray,          # y_test_binary
-    np.ndarray,          # y_test_class
-    np.ndarray           # w_test
+    pd.DataFrame | FeatureMatrix,  # X_train
+    np.ndarray,                    # y_train_binary
+    np.ndarray,                    # w_train
+    pd.DataFrame | FeatureMatrix,  # X_test
+    np.ndarray,                    # y_test_binary
+    np.ndarray,                    # y_test_class
+    np.ndarray                     # w_test
 ]:
+    """
+    output: "pandas" (X como pd.DataFrame) o "numpy" (X como FeatureMatrix,
+    float32 contiguo directo desde Polars, sin la copia intermedia a pandas)
+    """
     df = add_weight_class(df)
     df = add_binary_class(df, positives)
     X_train, y_train_binary, w_train, X_test, y_test_binary, y_test_class, w_test = split_test_train(df, month_train, month_test)
+
+    if output == "numpy":
+        return FeatureMatrix.from_polars(X_train), y_train_binary, w_train, FeatureMatrix.from_polars(X_test), y_test_binary, y_test_class, w_test
+    if output != "pandas":
+        raise ValueError(f"Unsupported preprocessing output: '{output}'")
     return X_train.to_pandas(), y_train_binary, w_train, X_test.to_pandas(), y_test_binary, y_test_class, w_test
 
 
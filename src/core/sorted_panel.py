@@ -0,0 +1,69 @@
+import polars as pl
+import numpy as np
+
+CLIENT = "numero_de_cliente"
+KEYS = ["numero_de_cliente", "foto_mes"]
+
+class SortedPanel:
+    """
+    Panel ordenado una sola vez por (numero_de_cliente, foto_mes) con el índice
+    de offsets de cada cliente (inicio/fin en el arreglo contiguo).
+
+    Con ese índice los lags, deltas, min/max y sumas móviles son shifts de
+    arreglos NumPy con una máscara de borde: O(n) por feature y sin volver a
+    ordenar ni particionar por cada expresión.
+    """
+
+    def __init__(self, df: pl.DataFrame):
+        self.df = df.sort(KEYS)
+
+        ids = self.df[CLIENT].to_numpy()
+        boundaries = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        self.starts = np.concatenate(([0], boundaries))
+        self.ends = np.concatenate((boundaries, [len(ids)]))
+        self.lengths = self.ends - self.starts
+
+        # Position of each row inside its customer (0 = first month)
+        self.position = np.arange(len(ids)) - np.repeat(self.starts, self.lengths)
+
+    def __len__(self) -> int:
+        return self.df.height
+
+    def column(self, col: str) -> tuple[np.ndarray, np.ndarray]:
+        """Values (nulls filled with 0) and validity mask of a column."""
+        s = self.df[col]
+        valid = s.is_not_null().to_numpy()
+        values = s.fill_null(0).to_numpy()
+        return values, valid
+
+    def shift(self, values: np.ndarray, valid: np.ndarray, i: int) -> tuple[np.ndarray, np.ndarray]:
+        """Value 'i' rows back within the same customer (lag)."""
+        out = np.zeros_like(values)
+        out_valid = np.zeros(len(values), dtype=bool)
+        if i < len(values):
+            out[i:] = values[:-i] if i > 0 else values
+            out_valid[i:] = valid[:-i] if i > 0 else valid
+        out_valid &= self.position >= i
+        return out, out_valid
+
+    def group_reduce(self, values: np.ndarray, valid: np.ndarray, op: str) -> tuple[np.ndarray, np.ndarray]:
+        """Per-customer max/min broadcast back to every row of the customer."""
+        if values.dtype.kind == "f":
+            fill = -np.inf if op == "max" else np.inf
+        else:
+            info = np.iinfo(values.dtype)
+            fill = info.min if op == "max" else info.max
+
+        ufunc = np.maximum if op == "max" else np.minimum
+        reduced = ufunc.reduceat(np.where(valid, values, fill), self.starts)
+        any_valid = np.add.reduceat(valid.astype(np.int64), self.starts) > 0
+
+        return np.repeat(reduced, self.lengths), np.repeat(any_valid, self.lengths)
+
+def to_series(name: str, values: np.ndarray, valid: np.ndarray, dtype: pl.DataType | None = None) -> pl.Series:
+    s = pl.Series(name, values)
+    if not valid.all():
+        s = s.scatter(np.flatnonzero(~valid), None)
+    if dtype is not None and s.dtype != dtype:
+        s = s.cast(dtype)
+    return s
@@ -0,0 +1,78 @@
+import polars as pl
+import logging
+import os
+import src.infra.logger_wrapper as log
+
+from src.infra.duckdb_runner import run_duckdb_query, export_duckdb_query
+
+logger = logging.getLogger(__name__)
+
+# clase_ternaria por continuidad mensual (misma lógica que notebooks/01_target_sql)
+CLASE_TERNARIA_SQL = """
+WITH base AS (
+  SELECT
+    *,
+    -- Índice mensual consecutivo: yyyymm -> (yyyy * 12 + mm)
+    ((foto_mes // 100) * 12 + (foto_mes % 100)) AS period_idx
+  FROM {source}
+),
+seq AS (
+  SELECT
+    *,
+    LEAD(period_idx, 1) OVER (PARTITION BY numero_de_cliente ORDER BY period_idx) AS p1,
+    LEAD(period_idx, 2) OVER (PARTITION BY numero_de_cliente ORDER BY period_idx) AS p2
+  FROM base
+),
+bounds AS (
+  SELECT MAX(period_idx) AS maxp FROM seq
+)
+SELECT
+  * EXCLUDE (period_idx, p1, p2),
+  CASE
+    -- BAJA+1: falta el mes siguiente (o no vuelve a aparecer)
+    WHEN period_idx < (SELECT maxp FROM bounds)
+         AND (p1 IS NULL OR p1 > period_idx + 1)
+    THEN 'BAJA+1'
+
+    -- BAJA+2: aparece el mes siguiente, pero falta el segundo siguiente
+    WHEN period_idx < (SELECT maxp FROM bounds) - 1
+         AND p1 = period_idx + 1
+         AND (p2 IS NULL OR p2 > period_idx + 2)
+    THEN 'BAJA+2'
+
+    -- CONTINUA: al menos 2 meses antes del máximo
+    WHEN period_idx <= (SELECT maxp FROM bounds) - 2
+    THEN 'CONTINUA'
+
+    -- Borde (último/anteúltimo mes global): no etiquetamos
+    ELSE NULL
+  END AS clase_ternaria
+FROM seq
+"""
+
+@log.process_log
+def label_clase_ternaria(df: pl.DataFrame) -> pl.DataFrame:
+    """
+    Calcula clase_ternaria (CONTINUA, BAJA+1, BAJA+2) sobre los snapshots
+    mensuales. Una etiqueta previa, si existe, se reemplaza.
+
+    La etiqueta de un mes solo depende de los dos meses siguientes, así que
+    alcanza con pasar el mes a etiquetar y los dos posteriores.
+    """
+    df = df.drop("clase_ternaria", strict=False)
+    return run_duckdb_query(df, CLASE_TERNARIA_SQL.format(source="df"))
+
+def build_labeled_store(raw_csv_path: str, root: str):
+    """
+    Etiqueta el CSV crudo completo y lo escribe directamente en el store
+    particionado por foto_mes. DuckDB lee el CSV y escribe Parquet en streaming,
+    sin pasar el dataset por Python.
+    """
+    source = f"read_csv_auto('{os.path.expanduser(raw_csv_path)}')"
+    logger.info(f"Building labeled store '{root}' from '{raw_csv_path}'")
+    export_duckdb_query(
+        CLASE_TERNARIA_SQL.format(source=source),
+        os.path.expanduser(root),
+        partition_by="foto_mes"
+    )
+    logger.info(f"Labeled store '{root}' built")
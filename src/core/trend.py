@@ -0,0 +1,121 @@
+import polars as pl
+import numpy as np
+
+from src.core.sorted_panel import SortedPanel, to_series
+
+TREND_STATS = ("slope", "intercept", "r2")
+
+def linreg_windows(config_linreg: dict) -> list[tuple[int, str]]:
+    """
+    Ventanas de la config de linreg y el sufijo de nombre de cada una.
+
+    "window": 3       -> [(3, "")]            (slope_{col}, como siempre)
+    "windows": [3, 6] -> [(3, "_w3"), (6, "_w6")]
+    """
+    if "windows" in config_linreg:
+        return [(w, f"_w{w}") for w in config_linreg["windows"]]
+    return [(config_linreg.get("window", 3), "")]
+
+def linreg_stats(config_linreg: dict) -> list[str]:
+    stats = config_linreg.get("stats", ["slope"])
+    unknown = set(stats) - set(TREND_STATS)
+    if unknown:
+        raise ValueError(f"Unsupported linreg stats: {sorted(unknown)}")
+    return list(stats)
+
+def trend_feature_names(config_linreg: dict) -> list[str]:
+    """Nombres de salida en el orden en que los generan todos los motores."""
+    return [
+        f"{stat}_{col}{suffix}"
+        for col in config_linreg["columns"]
+        for _, suffix in linreg_windows(config_linreg)
+        for stat in linreg_stats(config_linreg)
+    ]
+
+def rolling_trend(panel: SortedPanel, config_linreg: dict, x_col: str = "cliente_antiguedad") -> list[pl.Series]:
+    """
+    Regresión OLS móvil de cada columna contra 'x_col' sobre las últimas
+    'window' + 1 filas del cliente, para varias ventanas en una sola pasada.
+
+    Las sumas n, Σdx, Σdy, Σdx², Σdxdy (y Σdy² si se pide r2) se acumulan
+    sobre desvíos respecto de un valor de referencia de la propia ventana (el
+    último par válido del cliente, ver _reference): con sumas crudas,
+    n·Σy² - (Σy)² pierde toda la precisión por cancelación en columnas
+    monetarias grandes. Se agrega un shift por vez, así la ventana w+1
+    reutiliza las sumas de la ventana w.
+
+    Mismos resultados que REGR_SLOPE / REGR_INTERCEPT / REGR_R2 de DuckDB:
+    sin pares válidos todo es null; con x constante la pendiente es NaN y
+    intercept/r2 son null; con y constante r2 es 1.
+    """
+    windows = sorted(linreg_windows(config_linreg))
+    stats = linreg_stats(config_linreg)
+    max_window = windows[-1][0]
+
+    x_values, x_valid = panel.column(x_col)
+    x_values = x_values.astype(np.float64)
+
+    # Same-customer masks for each shift, shared by every column
+    masks = {j: panel.position[j:] >= j for j in range(1, max_window + 1)}
+
+    by_name = {}
+    for col in config_linreg["columns"]:
+        y_values, y_valid = panel.column(col)
+        valid = x_valid & y_valid
+        x = np.where(valid, x_values, 0.0)
+        y = np.where(valid, y_values.astype(np.float64), 0.0)
+        ref_x, ref_y = _reference(x, y, valid, masks, max_window)
+
+        keys = ["n", "dx", "dy", "dxdx", "dxdy"] + (["dydy"] if "r2" in stats else [])
+        sums = {k: np.zeros(len(x)) for k in keys}
+
+        size_done = 0
+        for window, suffix in windows:
+            for j in range(size_done, window + 1):
+                if j == 0:
+                    pair, dx, dy = valid, x - ref_x, y - ref_y
+                else:
+                    pair, dx, dy = masks[j] & valid[:-j], x[:-j] - ref_x[j:], y[:-j] - ref_y[j:]
+                terms = {"n": 1.0, "dx": dx, "dy": dy, "dxdx": dx * dx, "dxdy": dx * dy, "dydy": dy * dy}
+                for k in keys:
+                    sums[k][j:] += np.where(pair, terms[k], 0.0)
+            size_done = window + 1
+
+            for stat, values, valid_out in _trend_stats(sums, ref_x, ref_y, stats):
+                by_name[f"{stat}_{col}{suffix}"] = to_series(f"{stat}_{col}{suffix}", values, valid_out, pl.Float64)
+
+    return [by_name[name] for name in trend_feature_names(config_linreg)]
+
+def _reference(x: np.ndarray, y: np.ndarray, valid: np.ndarray, masks: dict[int, np.ndarray], max_window: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Par (x, y) más reciente válido del cliente dentro de la ventana más grande
+    que termina en cada fila (0 si no hay ninguno: la ventana no tiene pares).
+    """
+    ref_x, ref_y, found = x.copy(), y.copy(), valid.copy()
+    for j in range(1, max_window + 1):
+        take = ~found[j:] & masks[j] & valid[:-j]
+        ref_x[j:] = np.where(take, x[:-j], ref_x[j:])
+        ref_y[j:] = np.where(take, y[:-j], ref_y[j:])
+        found[j:] |= take
+    return ref_x, ref_y
+
+def _trend_stats(sums: dict[str, np.ndarray], ref_x: np.ndarray, ref_y: np.ndarray, stats: list[str]):
+    n, sdx, sdy = sums["n"], sums["dx"], sums["dy"]
+    has_pairs = n > 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Centered sums: shifting the data does not change them
+        sxx = sums["dxdx"] - sdx * sdx / n
+        sxy = sums["dxdy"] - sdx * sdy / n
+        x_varies = sxx != 0
+        slope = np.where(x_varies, sxy / sxx, np.nan)
+
+        for stat in stats:
+            if stat == "slope":
+                yield stat, slope, has_pairs
+            elif stat == "intercept":
+                yield stat, (ref_y + sdy / n) - slope * (ref_x + sdx / n), has_pairs & x_varies
+            elif stat == "r2":
+                syy = sums["dydy"] - sdy * sdy / n
+                r2 = np.where(syy == 0, 1.0, sxy * sxy / (sxx * syy))
+                yield stat, r2, has_pairs & x_varies
@@ -0,0 +1,127 @@
+import polars as pl
+import logging
+import os
+import glob
+
+import src.infra.loader_utils as lu
+
+from src.core.target import label_clase_ternaria
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMN = "foto_mes"
+PARTITION_FILE = "data.parquet"
+
+def partition_path(root: str, foto_mes: int) -> str:
+    """Hive-style folder of a month: <root>/foto_mes=<yyyymm>"""
+    return os.path.join(os.path.expanduser(root), f"{PARTITION_COLUMN}={foto_mes}")
+
+def store_months(root: str) -> list[int]:
+    """Returns the sorted months present in the store."""
+    root = os.path.expanduser(root)
+    if not os.path.isdir(root):
+        return []
+
+    prefix = f"{PARTITION_COLUMN}="
+    return sorted(
+        int(name[len(prefix):]) for name in os.listdir(root)
+        if name.startswith(prefix) and glob.glob(os.path.join(root, name, "*.parquet"))
+    )
+
+def scan_store(root: str, months: list[int] | None = None) -> pl.LazyFrame:
+    """
+    Returns a LazyFrame over the store. When 'months' is given only those
+    partitions are opened, the rest are never touched.
+    """
+    available = store_months(root)
+    if months is not None:
+        missing = sorted(set(months) - set(available))
+        if missing:
+            logger.warning(f"Months not found in store '{root}': {missing}")
+        available = [m for m in available if m in set(months)]
+
+    if not available:
+        raise FileNotFoundError(f"No partitions to read in store '{root}'")
+
+    files = []
+    for m in available:
+        files.extend(sorted(glob.glob(os.path.join(partition_path(root, m), "*.parquet"))))
+
+    return pl.scan_parquet(files)
+
+def write_partition(df_month: pl.DataFrame, root: str, foto_mes: int):
+    """Replaces the partition of a single month with 'df_month'."""
+    folder = partition_path(root, foto_mes)
+    lu.ensure_dirs(folder)
+
+    tmp_path = os.path.join(folder, PARTITION_FILE + ".tmp")
+    df_month.write_parquet(tmp_path)
+
+    for old in glob.glob(os.path.join(folder, "*.parquet")):
+        os.remove(old)
+    os.replace(tmp_path, os.path.join(folder, PARTITION_FILE))
+
+def write_store(df: pl.DataFrame, root: str):
+    """Writes the whole panel as one partition per foto_mes."""
+    months = df[PARTITION_COLUMN].unique().sort().to_list()
+    for m in months:
+        write_partition(df.filter(pl.col(PARTITION_COLUMN) == m), root, m)
+    logger.info(f"Store '{root}' written with {len(months)} partitions")
+
+def append_month(df_month: pl.DataFrame, root: str, labeler=label_clase_ternaria):
+    """
+    Adds a newly arrived month to the store without rewriting older partitions.
+
+    clase_ternaria of a month depends on the two following months, so only the
+    new month and the two before it are relabeled and rewritten. A month that
+    is not newer than the last stored one raises ValueError: rebuild the store
+    with build_labeled_store instead.
+
+    Parameters:
+    -----------
+    df_month : pl.DataFrame
+        Snapshot of a single foto_mes (with or without clase_ternaria)
+    root : str
+        Store folder
+    labeler : callable
+        Function pl.DataFrame -> pl.DataFrame that (re)computes clase_ternaria.
+        Defaults to the DuckDB labeling of src.core.target
+    """
+
+    months = df_month[PARTITION_COLUMN].unique().to_list()
+    if len(months) != 1:
+        raise ValueError(f"append_month expects a single foto_mes, got {months}")
+    new_month = months[0]
+
+    existing = store_months(root)
+    if existing and new_month <= existing[-1]:
+        # Relabeling from here would overwrite the labels of later months with a wrong horizon
+        raise ValueError(
+            f"Month {new_month} is not newer than the last stored month {existing[-1]}: "
+            "rebuild the store with build_labeled_store instead"
+        )
+
+    affected = [m for m in (lu.shift_month(new_month, -2), lu.shift_month(new_month, -1)) if m in existing]
+
+    frames = [df_month]
+    if affected:
+        history = scan_store(root, affected).collect()
+        frames = [history, _align(df_month, history.schema)]
+
+    labeled = labeler(pl.concat(frames, how="vertical_relaxed"))
+
+    for m in affected + [new_month]:
+        write_partition(labeled.filter(pl.col(PARTITION_COLUMN) == m), root, m)
+
+    logger.info(f"Appended month {new_month} to store '{root}'. Relabeled months: {affected}")
+
+def _align(df: pl.DataFrame, schema: pl.Schema) -> pl.DataFrame:
+    """Projects 'df' onto the store schema (missing columns become nulls)."""
+    extra = set(df.columns) - set(schema.names())
+    if extra:
+        logger.warning(f"Dropping columns not present in the store: {sorted(extra)}")
+
+    return df.select([
+        pl.col(name).cast(dtype) if name in df.columns else pl.lit(None, dtype=dtype).alias(name)
+        for name, dtype in schema.items()
+    ])
@@ -1,9 +1,209 @@
 import duckdb
 import polars as pl
+import pyarrow as pa
+import os
+import logging
+import threading
+import uuid
 
-def run_duckdb_query(df: pl.DataFrame, sql: str) -> pl.DataFrame:
-    """Executes a DuckDB SQL query over a DataFrame and returns the result."""
-    with duckdb.connect(database=":memory:") as con:
-        con.register("df", df)
-        result = con.execute(sql).pl()
-    return result
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+class DuckDBContext:
+    """
+    One DuckDB database reused by every stage of the pipeline, with explicit
+    resource settings instead of a fresh default ':memory:' connection per
+    query: 'memory_limit' plus 'temp_directory' make large window queries
+    spill to disk instead of running out of memory.
+
+    Each query runs on its own cursor, so the tables it registers are local
+    to it and concurrent queries (buckets, column groups) share the thread
+    pool and the memory budget of the same database.
+    """
+
+    def __init__(
+        self,
+        threads: int | None = None,
+        memory_limit: str | None = None,
+        temp_directory: str | None = None,
+        preserve_insertion_order: bool = False
+    ):
+        self.settings = {"preserve_insertion_order": preserve_insertion_order}
+        if threads is not None:
+            self.settings["threads"] = threads
+        if memory_limit is not None:
+            self.settings["memory_limit"] = memory_limit
+        if temp_directory is not None:
+            self.settings["temp_directory"] = os.path.expanduser(temp_directory)
+
+        self._connection: duckdb.DuckDBPyConnection | None = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict | None) -> "DuckDBContext":
+        """Builds the context from the DUCKDB section of the conf file."""
+        config = config or {}
+        return cls(
+            threads=config.get("THREADS", None),
+            memory_limit=config.get("MEMORY_LIMIT", None),
+            temp_directory=config.get("TEMP_DIRECTORY", None),
+            preserve_insertion_order=config.get("PRESERVE_INSERTION_ORDER", False)
+        )
+
+    @property
+    def connection(self) -> duckdb.DuckDBPyConnection:
+        with self._lock:
+            if self._connection is None:
+                if "temp_directory" in self.settings:
+                    os.makedirs(self.settings["temp_directory"], exist_ok=True)
+                self._connection = duckdb.connect(database=":memory:", config=self.settings)
+                logger.info(f"DuckDB context opened: {self.settings}")
+            return self._connection
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        return self.connection.cursor()
+
+    def query(self, sql: str, tables: dict[str, pl.DataFrame | pa.Table] | None = None, arrow: bool = False) -> pl.DataFrame | pa.Table:
+        """
+        Executes 'sql' with 'tables' registered under their names. Polars and
+        Arrow inputs are scanned in place (no copy); with 'arrow' the result is
+        returned as an Arrow table instead of being converted to Polars.
+        """
+        with self.cursor() as con:
+            for name, table in (tables or {}).items():
+                con.register(name, table)
+            result = con.execute(sql)
+            return result.fetch_arrow_table() if arrow else result.pl()
+
+    def execute(self, sql: str, tables: dict[str, pl.DataFrame | pa.Table] | None = None):
+        """Executes a statement without fetching a result (COPY, SET...)."""
+        with self.cursor() as con:
+            for name, table in (tables or {}).items():
+                con.register(name, table)
+            con.execute(sql)
+
+    @contextmanager
+    def loaded(self, df: pl.DataFrame | pa.Table):
+        """
+        Copies 'df' into a native table of the database for the duration of
+        the block and yields its name. Concurrent cursors must read from a
+        native table: scanning the same registered Python object from several
+        threads contends for the GIL and can deadlock. The copy is managed by
+        DuckDB, so it counts against 'memory_limit' and can spill.
+        """
+        name = f"df_{uuid.uuid4().hex}"
+        self.execute(f"CREATE TABLE {name} AS SELECT * FROM source", {"source": df})
+        try:
+            yield name
+        finally:
+            self.execute(f"DROP TABLE IF EXISTS {name}")
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+_context: DuckDBContext | None = None
+
+def configure_duckdb(config: dict | None = None) -> DuckDBContext:
+    """Replaces the shared context with one built from the DUCKDB conf section."""
+    global _context
+    if _context is not None:
+        _context.close()
+    _context = DuckDBContext.from_config(config)
+    return _context
+
+def get_context() -> DuckDBContext:
+    """Shared context, created with default settings on first use."""
+    global _context
+    if _context is None:
+        _context = DuckDBContext()
+    return _context
+
+def run_duckdb_query(df: pl.DataFrame | pa.Table, sql: str, arrow: bool = False) -> pl.DataFrame | pa.Table:
+    """Executes a DuckDB SQL query over a DataFrame (registered as 'df') and returns the result."""
+    return get_context().query(sql, {"df": df}, arrow=arrow)
+
+def run_duckdb_queries(df: pl.DataFrame, statements: list[str], n_jobs: int = 1) -> list[pl.DataFrame]:
+    """
+    Executes several queries over the same DataFrame (registered as 'df'),
+    up to 'n_jobs' at a time.
+    """
+    if n_jobs <= 1 or len(statements) == 1:
+        return [run_duckdb_query(df, sql) for sql in statements]
+
+    context = get_context()
+    with context.loaded(df) as table:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            return list(pool.map(lambda sql: context.query(f"WITH df AS (SELECT * FROM {table}) {sql}"), statements))
+
+def run_duckdb_query_bucketed(
+    df: pl.DataFrame,
+    sql: str,
+    n_buckets: int,
+    output_dir: str,
+    n_jobs: int = 1,
+    key: str = "numero_de_cliente"
+) -> list[str]:
+    """
+    Executes a DuckDB SQL query once per hash bucket of 'key' and streams each
+    partial result to Parquet, so only one bucket's window state is in memory
+    at a time (per job).
+
+    Only valid for queries whose windows are all partitioned by 'key': every
+    customer lands in exactly one bucket, so the union of the buckets equals
+    the unbucketed result (row order aside).
+
+    Nothing is read back: the caller gets the bucket files and decides how to
+    consume them (pl.scan_parquet(paths) streams them).
+
+    Parameters:
+    -----------
+    df : pl.DataFrame
+        Data registered as 'df' in the query
+    sql : str
+        Query over 'df'
+    n_buckets : int
+        Number of buckets
+    output_dir : str
+        Folder for the bucket files (bucket_<n>.parquet, overwritten)
+    n_jobs : int
+        Buckets executed concurrently on the shared context (same thread pool
+        and memory limit). The data is loaded once into a native table for them
+
+    Returns:
+    --------
+    list[str]
+        Paths of the bucket files, in bucket order
+    """
+    output_dir = os.path.expanduser(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    context = get_context()
+
+    def run_bucket(source: str, bucket: int) -> str:
+        path = os.path.join(output_dir, f"bucket_{bucket:04d}.parquet")
+        bucket_sql = f"WITH df AS (SELECT * FROM {source} WHERE hash({key}) % {n_buckets} = {bucket}) {sql}"
+        context.execute(f"COPY ({bucket_sql}) TO '{path}' (FORMAT PARQUET)", {"df_all": df} if source == "df_all" else None)
+        logger.debug(f"Bucket {bucket + 1}/{n_buckets} written to '{path}'")
+        return path
+
+    if n_jobs > 1:
+        with context.loaded(df) as table, ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            return list(pool.map(lambda b: run_bucket(table, b), range(n_buckets)))
+    return [run_bucket("df_all", b) for b in range(n_buckets)]
+
+def export_duckdb_query(sql: str, path: str, partition_by: str | None = None, df: pl.DataFrame | None = None):
+    """
+    Executes a DuckDB SQL query and streams the result to Parquet without
+    materializing it in Python. With 'partition_by' the output is a hive-style
+    folder (<path>/<col>=<value>/) that replaces any previous content.
+    """
+    options = "FORMAT PARQUET"
+    if partition_by is not None:
+        options += f", PARTITION_BY ({partition_by}), WRITE_PARTITION_COLUMNS true, OVERWRITE true, FILENAME_PATTERN 'data'"
+
+    get_context().execute(f"COPY ({sql}) TO '{path}' ({options})", {"df": df} if df is not None else None)
@@ -1,15 +1,28 @@
 import polars as pl
 import logging
 import os
+import json
+import hashlib
 
 logger = logging.getLogger(__name__)
 
+CACHE_FORMATS = {"parquet", "ipc"}
+KEY_COLUMNS = ["numero_de_cliente", "foto_mes"]
+
 def ensure_dirs(*paths: str):
     """Create directories if they don't exist."""
     for path in paths:
         os.makedirs(path, exist_ok=True)
 
-def load_data(path: str, format: str = "csv") -> pl.DataFrame | None:
+def load_data(
+    path: str,
+    format: str = "csv",
+    cache_dir: str | None = None,
+    cache_format: str = "parquet",
+    months: list[int] | None = None,
+    lookback: int = 0,
+    columns: list[str] | None = None
+) -> pl.DataFrame | None:
     """
     Carga el archivo ubicado en 'path' y lo devuelve en un dataframe
 
@@ -17,24 +30,266 @@ def load_data(path: str, format: str = "csv") -> pl.DataFrame | None:
     -----------
     path : str
         Ruta del archivo a cargar
-  
+    format : str
+        Formato del archivo: "csv", "parquet", "ipc" (Arrow IPC / Feather) o
+        "store" (carpeta particionada por foto_mes, ver dataset_store). En el
+        store solo se abren las particiones de los meses pedidos
+    cache_dir : str | None
+        Si se indica y el formato es "csv", el CSV se convierte una sola vez a
+        un archivo columnar en esta carpeta y las siguientes cargas leen de ahí.
+        El cache se invalida cuando cambia el tamaño, la fecha de modificación
+        o el contenido (hash) del CSV de origen.
+    cache_format : str
+        Formato del cache columnar: "parquet" o "ipc"
+    months : list[int] | None
+        Si se indica, la carga es lazy y solo se leen las filas de estos
+        foto_mes más, por cliente, las 'lookback' filas anteriores a cada una
+        (las que necesitan los lags y ventanas del feature engineering)
+    lookback : int
+        Cantidad de filas previas del cliente a conservar. Son filas, no
+        meses: como en los lags, un cliente con un hueco llega a una fila más
+        vieja (ver rows_with_lookback)
+    columns : list[str] | None
+        Si se indica, solo se leen estas columnas (siempre se agregan
+        numero_de_cliente y foto_mes)
+
     Returns:
     --------
     pl.DataFrame
         DataFrame con los datos cargados
     """
-    
+
     logger.info(f"Starting data loading from '{path}'")
 
     try:
-        if format == "csv":
+        if format == "store":
+            from src.infra import dataset_store as ds
+            if months is None:
+                df = prune_scan(ds.scan_store(path), None, 0, columns).collect()
+            else:
+                # Only the partitions that hold a needed row are opened
+                keys = lookback_keys(ds.scan_store(path), months, lookback)
+                lf = ds.scan_store(path, keys["foto_mes"].unique().sort().to_list())
+                df = prune_scan(lf.join(keys.lazy(), on=KEY_COLUMNS, how="semi"), None, 0, columns).collect()
+        elif months is not None or columns is not None:
+            if format not in CACHE_FORMATS and format != "csv":
+                logger.error(f"Unsupported file format: '{format}'")
+                return None
+            lf = scan_data(path, format, cache_dir, cache_format)
+            df = prune_scan(lf, months, lookback, columns).collect()
+        elif format == "csv" and cache_dir is not None:
+            cache_path = ensure_columnar_cache(path, cache_dir, cache_format)
+            df = _read_columnar(cache_path, cache_format)
+        elif format == "csv":
             df = pl.read_csv(path)
-            logger.info(f"Dataset loaded with {df.shape[0]} rows and {df.shape[1]} columns")
-            return df
+        elif format in CACHE_FORMATS:
+            df = _read_columnar(path, format)
         else:
             logger.error(f"Unsupported file format: '{format}'")
             return None
+
+        logger.info(f"Dataset loaded with {df.shape[0]} rows and {df.shape[1]} columns")
+        return df
     except Exception as e:
         logger.error(f"Error loading dataset: {e}")
         raise
-    
+
+def scan_data(path: str, format: str = "csv", cache_dir: str | None = None, cache_format: str = "parquet") -> pl.LazyFrame:
+    """
+    Returns a LazyFrame over the dataset so filters and projections are pushed
+    down to the reader. CSV sources go through the columnar cache when
+    'cache_dir' is set, which is what makes the pushdown effective.
+    """
+    if format == "csv" and cache_dir is not None:
+        path = ensure_columnar_cache(path, cache_dir, cache_format)
+        format = cache_format
+
+    if format == "csv":
+        return pl.scan_csv(path)
+    if format == "parquet":
+        return pl.scan_parquet(path)
+    if format == "ipc":
+        return pl.scan_ipc(path, memory_map=True)
+    if format == "store":
+        from src.infra import dataset_store as ds
+        return ds.scan_store(path)
+    raise ValueError(f"Unsupported file format: '{format}'")
+
+def prune_scan(
+    lf: pl.LazyFrame,
+    months: list[int] | None = None,
+    lookback: int = 0,
+    columns: list[str] | None = None
+) -> pl.LazyFrame:
+    """
+    Applies the month predicate (with 'lookback' rows per customer, see
+    lookback_keys) and the column projection to a scan.
+    """
+    if months is not None and lookback > 0:
+        keys = lookback_keys(lf, months, lookback)
+        lf = (
+            lf.filter(pl.col("foto_mes").is_in(keys["foto_mes"].unique().to_list()))
+            .join(keys.lazy(), on=KEY_COLUMNS, how="semi")
+        )
+    elif months is not None:
+        lf = lf.filter(pl.col("foto_mes").is_in(months))
+
+    if columns is not None:
+        names = lf.collect_schema().names()
+        keep = set(columns) | set(KEY_COLUMNS)
+        lf = lf.select([c for c in names if c in keep])
+
+    return lf
+
+def rows_with_lookback(df: pl.DataFrame | pl.LazyFrame, months: list[int], lookback: int) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Rows of 'months' and, per customer, the 'lookback' rows before each one.
+    Lags and windows count the customer's rows, not calendar months: with a
+    gap in the history the lookback reaches an older row, exactly as on the
+    full panel.
+    """
+    # A row is needed if one of the 'lookback' rows after it (or itself) is an output row
+    is_output = pl.col("foto_mes").is_in(months)
+    needed = pl.any_horizontal([
+        is_output.shift(-k).over("numero_de_cliente", order_by="foto_mes")
+        for k in range(lookback + 1)
+    ]).fill_null(False)
+    return df.filter(needed)
+
+def lookback_keys(lf: pl.LazyFrame, months: list[int], lookback: int) -> pl.DataFrame:
+    """(numero_de_cliente, foto_mes) of the rows_with_lookback, read from the key columns only."""
+    keys = lf.select(KEY_COLUMNS).filter(pl.col("foto_mes") <= max(months))
+    return rows_with_lookback(keys, months, lookback).collect()
+
+def shift_month(foto_mes: int, n: int) -> int:
+    """Moves a yyyymm period 'n' months (negative goes back in time)."""
+    period_idx = (foto_mes // 100) * 12 + (foto_mes % 100 - 1) + n
+    return (period_idx // 12) * 100 + period_idx % 12 + 1
+
+def ensure_columnar_cache(path: str, cache_dir: str, cache_format: str = "parquet") -> str:
+    """
+    Converts the CSV at 'path' to a columnar file inside 'cache_dir' unless an
+    up to date copy already exists, and returns the path of the cached file.
+
+    A JSON sidecar stores the source fingerprint and the schema inferred on the
+    first conversion. Later conversions (after the source changed) reuse that
+    schema so column types stay stable between refreshes.
+    """
+    if cache_format not in CACHE_FORMATS:
+        raise ValueError(f"Unsupported cache format: '{cache_format}'")
+
+    source = os.path.expanduser(path)
+    ensure_dirs(os.path.expanduser(cache_dir))
+    cache_path, meta_path = _cache_paths(source, cache_dir, cache_format)
+
+    meta = _read_meta(meta_path)
+    stat = os.stat(source)
+
+    if os.path.exists(cache_path) and meta.get("source") == source:
+        if meta.get("size") == stat.st_size and meta.get("mtime_ns") == stat.st_mtime_ns:
+            logger.info(f"Using columnar cache '{cache_path}'")
+            return cache_path
+
+        # Touched but maybe not modified: only the hash can tell
+        if meta.get("size") == stat.st_size and meta.get("sha256") == file_sha256(source):
+            meta["mtime_ns"] = stat.st_mtime_ns
+            _write_meta(meta_path, meta)
+            logger.info(f"Source mtime changed but content did not. Using columnar cache '{cache_path}'")
+            return cache_path
+
+        logger.info(f"Source '{source}' changed since last conversion. Rebuilding cache")
+
+    schema = _pinned_schema(meta.get("schema", {}))
+    if schema:
+        df = pl.read_csv(source, schema_overrides=schema, infer_schema_length=10000)
+    else:
+        df = pl.read_csv(source, infer_schema_length=None)
+
+    tmp_path = cache_path + ".tmp"
+    if cache_format == "parquet":
+        df.write_parquet(tmp_path)
+    else:
+        df.write_ipc(tmp_path)
+    os.replace(tmp_path, cache_path)
+
+    _write_meta(meta_path, {
+        "source": source,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(source),
+        "schema": {name: str(dtype) for name, dtype in df.schema.items()},
+    })
+    logger.info(f"Columnar cache written to '{cache_path}' ({df.shape[0]} rows, {df.shape[1]} cols)")
+
+    return cache_path
+
+def source_fingerprint(path: str, cache_dir: str | None = None, cache_format: str = "parquet") -> str:
+    """
+    sha256 of the source file at 'path'. With 'cache_dir' it is read from the
+    sidecar of the columnar cache (refreshing the cache if the source
+    changed), so an unchanged source is never hashed or scanned again.
+    """
+    if cache_dir is None:
+        return file_sha256(os.path.expanduser(path))
+
+    ensure_columnar_cache(path, cache_dir, cache_format)
+    _, meta_path = _cache_paths(os.path.expanduser(path), cache_dir, cache_format)
+    return _read_meta(meta_path)["sha256"]
+
+def frame_fingerprint(df: pl.DataFrame) -> str:
+    """
+    Content fingerprint of a DataFrame: schema, shape and a hash of every row.
+    Row hashes depend on the polars version, so the version is part of the key.
+    """
+    digest = hashlib.sha256()
+    digest.update(pl.__version__.encode())
+    digest.update(str(list(df.schema.items())).encode())
+    digest.update(str(df.shape).encode())
+    if df.height > 0:
+        digest.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the sha256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_paths(source: str, cache_dir: str, cache_format: str) -> tuple[str, str]:
+    """Columnar cache file of 'source' and its JSON sidecar."""
+    cache_dir = os.path.expanduser(cache_dir)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return (
+        os.path.join(cache_dir, f"{stem}.{cache_format}"),
+        os.path.join(cache_dir, f"{stem}.{cache_format}.meta.json"),
+    )
+
+def _read_columnar(path: str, format: str) -> pl.DataFrame:
+    if format == "parquet":
+        return pl.read_parquet(path)
+    return pl.read_ipc(path, memory_map=True)
+
+def _read_meta(meta_path: str) -> dict:
+    if not os.path.exists(meta_path):
+        return {}
+    try:
+        with open(meta_path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Ignoring unreadable cache metadata '{meta_path}': {e}")
+        return {}
+
+def _write_meta(meta_path: str, meta: dict):
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=4)
+
+def _pinned_schema(schema: dict[str, str]) -> dict[str, pl.DataType]:
+    """Rebuilds the simple dtypes (Int64, Float64, String...) of a stored schema."""
+    pinned = {}
+    for name, dtype_name in schema.items():
+        dtype = getattr(pl, dtype_name, None)
+        if isinstance(dtype, type) and issubclass(dtype, pl.DataType):
+            pinned[name] = dtype
+    return pinned
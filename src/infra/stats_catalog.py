@@ -0,0 +1,62 @@
+import polars as pl
+import logging
+import os
+
+import src.infra.loader_utils as lu
+
+logger = logging.getLogger(__name__)
+
+class StatsCatalog:
+    """
+    Column statistics persisted on disk and keyed by the dataset fingerprint,
+    so runs over the same data reuse them instead of rescanning the panel.
+    Only data-derived tables belong here: the key does not change when the
+    code that builds a table does.
+
+    Layout: <catalog_dir>/<fingerprint>/{profile,month_stats}.parquet
+    """
+
+    def __init__(self, catalog_dir: str, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.path = os.path.join(os.path.expanduser(catalog_dir), fingerprint)
+        self._tables: dict[str, pl.DataFrame] = {}
+
+    @classmethod
+    def for_source(
+        cls,
+        path: str,
+        catalog_dir: str,
+        cache_dir: str | None = None,
+        cache_format: str = "parquet"
+    ) -> "StatsCatalog":
+        """
+        Catalog of the dataset loaded from 'path', keyed by the source sha256
+        kept in the columnar cache sidecar (see loader_utils.source_fingerprint).
+        Its tables describe the whole file, as load_data returns it.
+        """
+        return cls(catalog_dir, lu.source_fingerprint(path, cache_dir, cache_format))
+
+    def get(self, name: str) -> pl.DataFrame | None:
+        """Returns a stored table ('profile', 'month_stats'...) or None."""
+        if name not in self._tables:
+            file = os.path.join(self.path, f"{name}.parquet")
+            if not os.path.exists(file):
+                return None
+            self._tables[name] = pl.read_parquet(file)
+            logger.info(f"Catalog hit for '{name}' ({self.fingerprint[:12]})")
+        return self._tables[name]
+
+    def put(self, name: str, table: pl.DataFrame):
+        lu.ensure_dirs(self.path)
+        tmp_path = os.path.join(self.path, f"{name}.parquet.tmp")
+        table.write_parquet(tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, f"{name}.parquet"))
+        self._tables[name] = table
+        logger.info(f"Catalog table '{name}' saved ({self.fingerprint[:12]})")
+
+    def get_or_compute(self, name: str, compute) -> pl.DataFrame:
+        table = self.get(name)
+        if table is None:
+            table = compute()
+            self.put(name, table)
+        return table
@@ -0,0 +1,99 @@
+import pandas as pd
+import numpy as np
+import lightgbm as lgb
+
+import hashlib
+import json
+import logging
+import os
+
+from src.core.preprocessing import FeatureMatrix
+
+logger = logging.getLogger(__name__)
+
+# Parameters that change how a Dataset is binned (the rest only affect training)
+BINNING_PARAMS = (
+    "max_bin", "max_bin_by_feature", "min_data_in_bin", "bin_construct_sample_cnt",
+    "data_random_seed", "seed", "use_missing", "zero_as_missing",
+    "feature_pre_filter", "categorical_feature", "linear_tree", "forcedbins_filename"
+)
+
+def lgb_dataset(X: pd.DataFrame | FeatureMatrix, label=None, weight=None, **kwargs) -> lgb.Dataset:
+    """lgb.Dataset from either output mode of preprocessing_pipeline."""
+    if isinstance(X, FeatureMatrix):
+        return lgb.Dataset(X.X, label=label, weight=weight, feature_name=X.feature_names, **kwargs)
+    return lgb.Dataset(X, label=label, weight=weight, **kwargs)
+
+def lgb_input(X: pd.DataFrame | FeatureMatrix) -> pd.DataFrame | np.ndarray:
+    """Data to pass to Booster.predict for either output mode."""
+    return X.X if isinstance(X, FeatureMatrix) else X
+
+def binning_params(params: dict) -> dict:
+    """Subset of 'params' that determines the binned Dataset."""
+    selected = {k: params[k] for k in BINNING_PARAMS if k in params}
+    # With the pre-filter on, features are dropped according to min_data_in_leaf
+    if params.get("feature_pre_filter", True) and "min_data_in_leaf" in params:
+        selected["min_data_in_leaf"] = params["min_data_in_leaf"]
+    return selected
+
+def dataset_key(X: pd.DataFrame | FeatureMatrix, label: np.ndarray, weight: np.ndarray | None, params: dict) -> str:
+    """Hash of the features, labels, weights and binning params of a Dataset."""
+    digest = hashlib.sha256()
+    digest.update(f"lightgbm {lgb.__version__}".encode())
+    digest.update(json.dumps(binning_params(params), sort_keys=True, default=str).encode())
+
+    if isinstance(X, FeatureMatrix):
+        digest.update(json.dumps([X.feature_names, X.X.shape, str(X.X.dtype)]).encode())
+        digest.update(X.X.ravel(order="K"))
+    else:
+        digest.update(json.dumps([list(map(str, X.columns)), X.shape, list(map(str, X.dtypes))]).encode())
+        digest.update(pd.util.hash_pandas_object(X, index=False).to_numpy())
+
+    digest.update(np.ascontiguousarray(label, dtype=np.float64))
+    if weight is not None:
+        digest.update(np.ascontiguousarray(weight, dtype=np.float64))
+    return digest.hexdigest()
+
+def cached_dataset(
+    X: pd.DataFrame | FeatureMatrix | None,
+    label: np.ndarray,
+    weight: np.ndarray | None,
+    params: dict,
+    cache_dir: str | None = None,
+    free_raw_data: bool = True,
+    key: str | None = None
+) -> lgb.Dataset:
+    """
+    lgb.Dataset of (X, label, weight) binned with 'params'. With 'cache_dir'
+    the constructed Dataset is saved with save_binary and later runs with the
+    same data and binning params load the bins instead of recomputing them.
+
+    'key' is a precomputed dataset_key, so processes that share a cached
+    Dataset do not hash X again. X is only read on a cache miss: it can be
+    None when the Dataset of 'key' is already in 'cache_dir'.
+    """
+    dataset_params = binning_params(params)
+    if "verbose" in params:
+        dataset_params["verbose"] = params["verbose"]
+    if cache_dir is None:
+        return lgb_dataset(X, label=label, weight=weight, params=dataset_params, free_raw_data=free_raw_data)
+
+    cache_dir = os.path.expanduser(cache_dir)
+    if key is None:
+        key = dataset_key(X, label, weight, params)
+    path = os.path.join(cache_dir, f"dataset_{key}.bin")
+    if os.path.exists(path):
+        logger.info(f"LightGBM Dataset cache hit: '{path}'")
+        return lgb.Dataset(path, params=dataset_params, free_raw_data=free_raw_data)
+    if X is None:
+        raise FileNotFoundError(f"No cached Dataset at '{path}' and no data to build it")
+
+    dataset = lgb_dataset(X, label=label, weight=weight, params=dataset_params, free_raw_data=free_raw_data)
+    dataset.construct()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    dataset.save_binary(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    logger.info(f"LightGBM Dataset cached at '{path}'")
+
+    return dataset
@@ -0,0 +1,89 @@
+import pandas as pd
+import lightgbm as lgb
+
+import glob
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def gain_importance(models: list[lgb.Booster | str]) -> pd.DataFrame:
+    """
+    Gain importance promedio de uno o más modelos (Booster o ruta a un modelo
+    guardado con save_model). El gain de cada modelo se normaliza a
+    proporción antes de promediar, así modelos con distinta cantidad de
+    árboles pesan lo mismo.
+
+    Returns:
+    --------
+    pd.DataFrame
+        feature, gain_share (promedio), n_models_used (modelos con gain > 0),
+        ordenado por gain_share descendente
+    """
+    shares = []
+    for model in models:
+        if isinstance(model, str):
+            model = lgb.Booster(model_file=model)
+        gain = model.feature_importance(importance_type="gain")
+        total = gain.sum()
+        shares.append(pd.Series(gain / total if total > 0 else gain, index=model.feature_name()))
+
+    table = pd.concat(shares, axis=1).fillna(0.0)
+    importance = pd.DataFrame({
+        "feature": table.index,
+        "gain_share": table.mean(axis=1).to_numpy(),
+        "n_models_used": (table > 0).sum(axis=1).to_numpy(),
+    })
+    return importance.sort_values("gain_share", ascending=False, ignore_index=True)
+
+def select_features(importance: pd.DataFrame, min_gain_share: float = 0.0) -> tuple[list[str], list[str]]:
+    """
+    Features a conservar: gain_share por encima de 'min_gain_share'.
+
+    Returns:
+    --------
+    tuple[list[str], list[str]]
+        (conservadas, descartadas)
+    """
+    keep = importance["gain_share"] > min_gain_share
+    return importance.loc[keep, "feature"].tolist(), importance.loc[~keep, "feature"].tolist()
+
+def write_pruned_features(
+    models: list[lgb.Booster | str] | str,
+    path: str,
+    min_gain_share: float = 0.0
+) -> list[str]:
+    """
+    Calcula la importancia de 'models' (o de todos los .txt de una carpeta) y
+    escribe en 'path' el JSON con las features conservadas y descartadas. En
+    la próxima corrida col_selection y feature_engineering_pipeline dejan de
+    generar las descartadas; lo que los modelos no vieron se genera igual.
+    """
+    if isinstance(models, str):
+        models = sorted(glob.glob(os.path.join(os.path.expanduser(models), "*.txt")))
+        if not models:
+            raise FileNotFoundError("No saved models to read the importance from")
+
+    importance = gain_importance(models)
+    keep, dropped = select_features(importance, min_gain_share=min_gain_share)
+
+    path = os.path.expanduser(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({
+            "features": keep,
+            "dropped": dropped,
+            "min_gain_share": min_gain_share,
+            "models": [m if isinstance(m, str) else "<booster>" for m in models],
+        }, f, indent=4)
+
+    logger.info(f"Pruned feature list saved at '{path}': {len(keep)} kept, {len(dropped)} dropped")
+    return keep
+
+def load_pruned_features(path: str | None) -> set[str] | None:
+    """Features descartadas del JSON de write_pruned_features, o None si no hay lista."""
+    if path is None or not os.path.exists(os.path.expanduser(path)):
+        return None
+    with open(os.path.expanduser(path)) as f:
+        return set(json.load(f)["dropped"])
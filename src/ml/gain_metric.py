@@ -0,0 +1,89 @@
+import numpy as np
+import lightgbm as lgb
+
+import math
+import weakref
+
+# clase_peso of BAJA+2, the only class that earns the gain
+POSITIVE_WEIGHT = 1.00002
+
+class GainMetric:
+    """
+    Máxima ganancia acumulada ordenando por probabilidad descendente (el
+    mismo valor que gan_eval), pensada para llamarse en cada ronda de cada fold.
+
+    Por fold (Dataset de validación) se calcula una sola vez el vector de
+    ganancias: +gain para BAJA+2 y -cost para el resto (-cost·multiplicador
+    si se pasa 'cost_multiplier', ver subsample_continua). Con P positivos, un
+    prefijo de largo L >= P·(1 + gain/cost) suma a lo sumo 0, así que el
+    máximo está entre los primeros K = ceil(P·(1 + gain/cost)): alcanza con
+    un argpartition de K elementos y ordenar solo esos, en vez de ordenar
+    todo el fold. Si ese máximo es negativo se recurre al orden completo.
+
+    Los empates de y_pred se ordenan por fila (orden estable), tanto en el
+    top-K como en el orden completo: el valor es exactamente el de gan_eval
+    con np.argsort(-y_pred, kind="stable").
+
+    'positives' (BAJA+2) y 'cost_multiplier' son opcionales y van alineados
+    con las filas del Dataset de entrenamiento; los folds de lgb.cv son
+    subsets suyos y se leen con used_indices. Sin 'positives', BAJA+2 son las
+    filas con peso POSITIVE_WEIGHT.
+    """
+
+    def __init__(
+        self,
+        gain_amount: float,
+        cost_amount: float,
+        name: str = "gan_eval",
+        positives: np.ndarray | None = None,
+        cost_multiplier: np.ndarray | None = None
+    ):
+        self.gain_amount = gain_amount
+        self.cost_amount = cost_amount
+        self.name = name
+        self.positives = positives
+        self.cost_multiplier = cost_multiplier
+        # Keyed by the Dataset itself: entries vanish with the fold's Dataset,
+        # so a recycled id() can never return the gains of another fold
+        self._folds = weakref.WeakKeyDictionary()
+
+    def _fold(self, data: lgb.Dataset) -> tuple[np.ndarray, int, np.ndarray]:
+        fold = self._folds.get(data)
+        if fold is None:
+            if self.positives is not None:
+                positive = self._rows(self.positives, data)
+            else:
+                positive = data.get_weight() == POSITIVE_WEIGHT
+            cost = self.cost_amount
+            if self.cost_multiplier is not None:
+                cost = cost * self._rows(self.cost_multiplier, data)
+            gains = np.where(positive, self.gain_amount, -cost).astype(np.float64)
+            n_positives = int(positive.sum())
+            k = min(len(gains), math.ceil(n_positives * (1 + self.gain_amount / self.cost_amount)))
+            fold = (gains, k, np.empty(k, dtype=np.float64))
+            self._folds[data] = fold
+        return fold
+
+    @staticmethod
+    def _rows(values: np.ndarray, data: lgb.Dataset) -> np.ndarray:
+        # lgb.cv folds are subsets of the training Dataset
+        return values if data.used_indices is None else values[data.used_indices]
+
+    def value(self, y_pred: np.ndarray, data: lgb.Dataset) -> float:
+        gains, k, buffer = self._fold(data)
+
+        if 0 < k < len(gains):
+            # Every row tied with the K-th score competes for the last places:
+            # keep them all and let the stable sort pick the first by row
+            threshold = y_pred[np.argpartition(y_pred, len(y_pred) - k)[len(y_pred) - k]]
+            top = np.flatnonzero(y_pred >= threshold)
+            top = top[np.argsort(-y_pred[top], kind="stable")[:k]]
+            np.cumsum(gains[top], out=buffer)
+            best = buffer.max()
+            if best >= 0:
+                return float(best)
+
+        return float(np.max(np.cumsum(gains[np.argsort(-y_pred, kind="stable")])))
+
+    def __call__(self, y_pred: np.ndarray, data: lgb.Dataset) -> tuple[str, float, bool]:
+        return self.name, self.value(y_pred, data), True
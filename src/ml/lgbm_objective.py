@@ -1,59 +1,123 @@
 from src.ml.optimization_config import OptimizationConfig
+from src.ml.dataset_cache import cached_dataset
+from src.ml.gain_metric import GainMetric, POSITIVE_WEIGHT
 import numpy as np
 import lightgbm as lgb
+import optuna
+
+from sklearn.model_selection import StratifiedKFold
+
+# Params shared by every trial; the binned Dataset only depends on these
+BASE_PARAMS = {
+    'objective': 'binary',
+    'metric': 'custom',
+    'boosting_type': 'gbdt',
+    'max_bin': 31,
+    'first_metric_only': True,
+    'boost_from_average': True,
+    'feature_pre_filter': False,
+    'verbose': -1
+}
+
+class GainPruningCallback:
+    """
+    lgb.cv callback that reports the best 'valid gan_eval-mean' so far (times
+    n_folds, the scale of the trial value) to the Optuna trial every
+    'interval' rounds, and raises optuna.TrialPruned when the pruner says so.
+    """
+
+    order = 40
+
+    def __init__(self, trial: optuna.Trial, n_folds: int, interval: int = 10, metric: str = "gan_eval"):
+        self.trial = trial
+        self.n_folds = n_folds
+        self.interval = interval
+        self.metric = metric
+        self.best = -np.inf
+        self.rounds = 0
+
+    def __call__(self, env: lgb.callback.CallbackEnv) -> None:
+        self.rounds = env.iteration + 1
+        for dataset_name, metric_name, mean, *_ in env.evaluation_result_list:
+            if dataset_name == "valid" and metric_name == self.metric:
+                self.best = max(self.best, mean)
+
+        if self.rounds % self.interval != 0:
+            return
+
+        self.trial.report(self.best * self.n_folds, self.rounds)
+        if self.trial.should_prune():
+            raise optuna.TrialPruned(f"Pruned at round {self.rounds} with gain {self.best * self.n_folds:.0f}")
+
+def training_weight(w_train, cost_multiplier: np.ndarray | None = None) -> np.ndarray:
+    """Class weights times the cost multiplier of the subsampled rows (see subsample_continua)."""
+    w_train = np.asarray(w_train)
+    return w_train if cost_multiplier is None else w_train * cost_multiplier
 
 class LightGBMObjective:
-    def __init__(self, X_train, y_train, w_train, cfg: OptimizationConfig):
-        self.X_train = X_train
+    """
+    'w_train' are the class weights (clase_peso). 'cost_multiplier', aligned
+    with the rows, is how many customers each row stands for: it scales the
+    training weight and the cost in gan_eval, while BAJA+2 is still read from
+    the unmodified class weights.
+    """
+
+    def __init__(self, X_train, y_train, w_train, cfg: OptimizationConfig, dataset_key: str | None = None, cost_multiplier: np.ndarray | None = None):
         self.y_train = y_train
         self.w_train = w_train
         self.cfg = cfg
+        self.metric = GainMetric(
+            cfg.gain_amount, cfg.cost_amount,
+            positives=np.asarray(w_train) == POSITIVE_WEIGHT,
+            cost_multiplier=cost_multiplier
+        )
 
-    def gan_eval(self, y_pred, data):
-        weight = data.get_weight()
-        gain = np.where(weight == 1.00002, self.cfg.gain_amount, 0)
-        cost = np.where(weight < 1.00002, self.cfg.cost_amount, 0)
+        # Binned once per study and reused by every trial. The raw matrix is
+        # released after construction (free_raw_data), so the caller can drop X_train
+        self.train_data = cached_dataset(
+            X_train, y_train, training_weight(w_train, cost_multiplier),
+            {**BASE_PARAMS, 'seed': cfg.seeds[0]},
+            cfg.dataset_cache_dir,
+            free_raw_data=True,
+            key=dataset_key
+        ).construct()
+
+        # Same splits lgb.cv builds with stratified=True, nfold and seed
+        skf = StratifiedKFold(n_splits=cfg.n_folds, shuffle=True, random_state=cfg.seeds[0])
+        self.folds = list(skf.split(np.empty(len(y_train)), y_train))
 
-        ganancia = gain - cost
-        ganancia = ganancia[np.argsort(y_pred)[::-1]]
-        return 'gan_eval', np.max(np.cumsum(ganancia)), True
+    def gan_eval(self, y_pred, data):
+        return self.metric(y_pred, data)
     
     def __call__(self, trial):
         params = {
-            'objective': 'binary',
-            'metric': 'custom',
-            'boosting_type': 'gbdt',
-            'max_bin': 31,
-            'first_metric_only': True,
-            'boost_from_average': True,
-            'feature_pre_filter': False,
+            **BASE_PARAMS,
             'num_leaves': trial.suggest_int('num_leaves', 80, 150),
             'learning_rate': trial.suggest_float('learning_rate', 0.010, 0.2),
-            'min_data_in_leaf': trial.suggest_int('min_data_in_leaf', 400, 1000),
+            'min_data_in_leaf': max(1, round(trial.suggest_int('min_data_in_leaf', 400, 1000) * self.cfg.row_share)),
             'feature_fraction': trial.suggest_float('feature_fraction', 0.1, 0.7),
             'bagging_fraction': trial.suggest_float('bagging_fraction', 0.1, 0.4),
-            'seed': self.cfg.seeds[0],
-            'verbose': -1
+            'seed': self.cfg.seeds[0]
         }
+        if self.cfg.num_threads is not None:
+            params['num_threads'] = self.cfg.num_threads
 
-        train_data = lgb.Dataset(self.X_train,
-                            label=self.y_train,
-                            weight=self.w_train)
-        
+        pruning = GainPruningCallback(trial, self.cfg.n_folds, interval=self.cfg.prune_interval)
         cv_results = lgb.cv(
             params,
-            train_data,
+            self.train_data,
             num_boost_round=self.cfg.n_boosts,
             feval=self.gan_eval,
-            stratified=True,
-            nfold=self.cfg.n_folds,
+            folds=self.folds,
             seed=self.cfg.seeds[0],
             callbacks=[
                 lgb.early_stopping(stopping_rounds=int(50 + 5 / params['learning_rate']), verbose=False),
-                lgb.log_evaluation(period=200)
+                lgb.log_evaluation(period=200),
+                pruning
             ]
         )
 
         max_gan = max(cv_results['valid gan_eval-mean'])
         trial.set_user_attr("best_iter", cv_results['valid gan_eval-mean'].index(max_gan) + 1)
+        trial.set_user_attr("n_rounds", pruning.rounds)
         return max_gan * self.cfg.n_folds
@@ -1,17 +1,170 @@
-from src.ml.lgbm_objective import LightGBMObjective
+from src.ml.lgbm_objective import BASE_PARAMS, LightGBMObjective, training_weight
 from src.ml.optuna_runner import OptunaRunner
 from src.ml.optimization_config import OptimizationConfig
+from src.ml.dataset_cache import cached_dataset, dataset_key
+from src.core.preprocessing import FeatureMatrix
+import src.config.logger_config as lc
 
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from optuna.trial import TrialState
+
+import multiprocessing
+import numpy as np
 import logging
+import tempfile
+import shutil
+import os
 
 logger = logging.getLogger(__name__)
 
 def run_lgbm_optimization(X_train, y_train, w_train, cfg: OptimizationConfig):
-    objective = LightGBMObjective(X_train, y_train, w_train, cfg)
     runner = OptunaRunner(cfg)
 
-    study = runner.run_study(objective)
+    if cfg.fidelity_ratio is not None:
+        promoted = run_low_fidelity_optimization(X_train, y_train, w_train, cfg)
+        study = runner.create_study()
+        for params in promoted:
+            study.enqueue_trial(params, user_attrs={"promoted": True}, skip_if_exists=True)
+
+        # The full-data budget is the promoted trials still waiting (a resumed
+        # study skips the ones it already ran), not n_trials of unscreened samples
+        waiting = len(study.get_trials(deepcopy=False, states=(TrialState.WAITING,)))
+        logger.info(f"{len(promoted)} low-fidelity configurations promoted to {runner.study_name}, {waiting} to run")
+        cfg = replace(cfg, n_trials=waiting)
+        runner = OptunaRunner(cfg)
+
+    study = _optimize(X_train, y_train, w_train, cfg, runner) if cfg.n_trials > 0 else runner.create_study()
+
+    runner.record_pruning_stats(study)
     runner.save_best_params(study)
     logger.info("Optimization completed successfully.")
 
     return study
+
+def _optimize(X_train, y_train, w_train, cfg: OptimizationConfig, runner: OptunaRunner, cost_multiplier=None):
+    if cfg.n_workers > 1:
+        return run_parallel_optimization(X_train, y_train, w_train, cfg, runner, cost_multiplier=cost_multiplier)
+
+    objective = LightGBMObjective(X_train, y_train, w_train, cfg, cost_multiplier=cost_multiplier)
+    return runner.run_study(objective)
+
+def subsample_continua(X_train, y_train, w_train, ratio: float, seed: int):
+    """
+    Keeps every BAJA row and a 'ratio' share of the CONTINUA rows (label 0
+    and weight 1.0), sampled separately in each foto_mes. The class weights
+    are returned unchanged, plus a cost multiplier: n_month / n_kept for the
+    kept CONTINUA rows and 1 for the rest, so their training weight and their
+    cost in gan_eval (see LightGBMObjective) stand for the rows left out.
+    """
+    if not 0 < ratio <= 1:
+        raise ValueError(f"fidelity_ratio must be in (0, 1], got {ratio}")
+
+    y_train = np.asarray(y_train)
+    w_train = np.asarray(w_train, dtype=np.float64)
+    if isinstance(X_train, FeatureMatrix):
+        months = X_train.X[:, X_train.feature_names.index("foto_mes")]
+    else:
+        months = X_train["foto_mes"].to_numpy()
+
+    continua = (y_train == 0) & (w_train == 1.0)
+    keep = ~continua
+    multiplier = np.ones(len(y_train))
+    rng = np.random.default_rng(seed)
+
+    for month in np.unique(months[continua]):
+        rows = np.flatnonzero(continua & (months == month))
+        n_kept = max(1, round(ratio * len(rows)))
+        keep[rng.choice(rows, size=n_kept, replace=False)] = True
+        multiplier[rows] = len(rows) / n_kept
+
+    rows = np.flatnonzero(keep)
+    if isinstance(X_train, FeatureMatrix):
+        X_sub = FeatureMatrix(np.asfortranarray(X_train.X[rows]), X_train.feature_names, X_train.numero_de_cliente[rows])
+    else:
+        X_sub = X_train.iloc[rows].reset_index(drop=True)
+
+    logger.info(f"Low-fidelity sample: {len(rows)} of {len(y_train)} rows ({continua[rows].sum()} CONTINUA of {continua.sum()})")
+    return X_sub, y_train[rows], w_train[rows], multiplier[rows]
+
+def run_low_fidelity_optimization(X_train, y_train, w_train, cfg: OptimizationConfig) -> list[dict]:
+    """
+    Runs the low-fidelity study (its own study, named '<name>_lowfi') on the
+    CONTINUA subsample and returns the params of its 'cfg.promote_top' best
+    completed trials, best first.
+    """
+    X_sub, y_sub, w_sub, multiplier = subsample_continua(X_train, y_train, w_train, cfg.fidelity_ratio, cfg.seeds[0])
+
+    low_cfg = replace(
+        cfg,
+        name=f"{cfg.name}_lowfi",
+        n_trials=cfg.low_fidelity_trials or cfg.n_trials,
+        fidelity_ratio=None,
+        row_share=len(y_sub) / len(y_train)
+    )
+    low_runner = OptunaRunner(low_cfg)
+    study = _optimize(X_sub, y_sub, w_sub, low_cfg, low_runner, cost_multiplier=multiplier)
+    low_runner.record_pruning_stats(study)
+
+    completed = study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,))
+    best = sorted(completed, key=lambda t: t.value, reverse=True)[:cfg.promote_top]
+    return [t.params for t in best]
+
+def run_parallel_optimization(X_train, y_train, w_train, cfg: OptimizationConfig, runner: OptunaRunner, cost_multiplier=None):
+    """
+    Runs the study in 'cfg.n_workers' processes that share its storage, and
+    splits the CPUs among them through num_threads.
+
+    The Dataset is binned once here and saved with save_binary (in
+    cfg.dataset_cache_dir, or in a temporary folder under cfg.output_path);
+    the workers get its key and load the bins, so none of them hashes or bins
+    X again. Only the labels, class weights and cost multiplier are written,
+    for the folds and gan_eval.
+
+    The workers share the sqlite file of OptunaRunner.storage(): they must run
+    on this host, since sqlite locking is not reliable on network
+    filesystems, and each transaction takes the write lock with BEGIN
+    IMMEDIATE (see _serialize_sqlite_transactions).
+    """
+    study = runner.create_study()
+
+    data_dir = tempfile.mkdtemp(prefix="lgbm_shared_", dir=os.path.expanduser(cfg.output_path))
+    try:
+        params = {**BASE_PARAMS, 'seed': cfg.seeds[0]}
+        weight = training_weight(w_train, cost_multiplier)
+        key = dataset_key(X_train, y_train, weight, params)
+        cache_dir = cfg.dataset_cache_dir or data_dir
+        cached_dataset(X_train, y_train, weight, params, cache_dir, key=key).construct()
+
+        np.save(os.path.join(data_dir, "y.npy"), np.asarray(y_train))
+        np.save(os.path.join(data_dir, "w.npy"), np.asarray(w_train))
+        if cost_multiplier is not None:
+            np.save(os.path.join(data_dir, "cost_multiplier.npy"), cost_multiplier)
+
+        threads = cfg.num_threads or max(1, (os.cpu_count() or 1) // cfg.n_workers)
+        worker_cfg = replace(cfg, n_workers=1, num_threads=threads, dataset_cache_dir=cache_dir)
+        trials = runner.split_trials()
+        logging_setup = (logging.getLogger().getEffectiveLevel(), lc.log_files())
+
+        logger.info(f"Starting {len(trials)} workers ({threads} threads each) for trials {trials}")
+        # spawn: forking after LightGBM/OpenMP has run in this process can deadlock the children
+        with ProcessPoolExecutor(max_workers=len(trials), mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_optimization_worker, data_dir, worker_cfg, n, key, logging_setup) for n in trials]
+            for future in futures:
+                future.result()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return runner.create_study()
+
+def _optimization_worker(data_dir: str, cfg: OptimizationConfig, n_trials: int, key: str, logging_setup: tuple[int, list[str]]) -> int:
+    lc.setup_worker_logging(*logging_setup)
+
+    y = np.load(os.path.join(data_dir, "y.npy"))
+    w = np.load(os.path.join(data_dir, "w.npy"))
+    multiplier_path = os.path.join(data_dir, "cost_multiplier.npy")
+    multiplier = np.load(multiplier_path) if os.path.exists(multiplier_path) else None
+
+    objective = LightGBMObjective(None, y, w, cfg, dataset_key=key, cost_multiplier=multiplier)
+    OptunaRunner(cfg).run_study(objective, n_trials=n_trials)
+    return n_trials
@@ -5,6 +5,9 @@ import lightgbm as lgb
 
 from dataclasses import dataclass
 
+from src.core.preprocessing import FeatureMatrix
+from src.ml.dataset_cache import cached_dataset, lgb_input
+
 
 import logging
 from time import time
@@ -23,10 +26,13 @@ class TrainTestConfig:
     output_path: str
     seeds: list[int]
 
+    # Folder for the binned LightGBM Datasets (None = no cache)
+    dataset_cache_dir: str | None = None
+
 
 logger = logging.getLogger(__name__)
 
-def entrenamiento_lgbm(X_train:pd.DataFrame ,y_train_binaria:pd.Series,w_train:pd.Series, 
+def entrenamiento_lgbm(X_train:pd.DataFrame | FeatureMatrix ,y_train_binaria:pd.Series,w_train:pd.Series, 
                        best_iter:int, best_parameters:dict[str, object], tt_cfg :TrainTestConfig
                        )->lgb.Booster:
     logger.info(f"Comienzo del entrenamiento del lgbm : {tt_cfg.name}")
@@ -48,9 +54,7 @@ def entrenamiento_lgbm(X_train:pd.DataFrame ,y_train_binaria:pd.Series,w_train:p
         'verbose': 0
     }
 
-    train_data = lgb.Dataset(X_train,
-                            label=y_train_binaria,
-                            weight=w_train)
+    train_data = cached_dataset(X_train, y_train_binaria, w_train, params, tt_cfg.dataset_cache_dir)
 
     model_lgbm = lgb.train(params,
                     train_data,
@@ -73,9 +77,9 @@ def ganancia_prob(y_pred:pd.Series, y_true:pd.Series ,prop=1,threshold:int=0.025
     ganancia = np.where(y_true == 1, 780000, 0) - np.where(y_true == 0, 20000, 0)
     return ganancia[y_pred >= threshold].sum() / prop
 
-def evaluacion_lgbm(X_test:pd.DataFrame , y_test:pd.Series , model_lgbm:lgb.Booster)-> pd.Series:
+def evaluacion_lgbm(X_test:pd.DataFrame | FeatureMatrix , y_test:pd.Series , model_lgbm:lgb.Booster)-> pd.Series:
     logger.info("comienzo evaluacion modelo")
-    y_pred_lgm = model_lgbm.predict(X_test)
+    y_pred_lgm = model_lgbm.predict(lgb_input(X_test))
     ganancia = ganancia_prob(y_pred_lgm , y_test)
     logger.info("fin evaluacion modelo")
     print(f"ganancia:{ganancia}")
@@ -13,3 +13,32 @@ class OptimizationConfig:
     n_boosts: int
     seeds: list[int]
     output_path: str
+
+    # Folder for the binned LightGBM Datasets (None = no cache)
+    dataset_cache_dir: str | None = None
+
+    # Worker processes sharing the study, and LightGBM threads per worker
+    # (None = the CPU count split among the workers)
+    n_workers: int = 1
+    num_threads: int | None = None
+
+    # Trial pruning on the running best 'valid gan_eval-mean' of lgb.cv:
+    # "median" | "successive_halving" | "hyperband" (None = no pruning).
+    # The value is reported every 'prune_interval' rounds and no trial is
+    # pruned before 'prune_warmup' rounds
+    pruner: str | None = None
+    prune_interval: int = 10
+    prune_warmup: int = 100
+
+    # Multi-fidelity search: with 'fidelity_ratio' set, 'low_fidelity_trials'
+    # (None = n_trials) run first on all the BAJA rows plus that share of the
+    # CONTINUA rows, and the full-data study only runs the 'promote_top' best
+    # configurations
+    fidelity_ratio: float | None = None
+    low_fidelity_trials: int | None = None
+    promote_top: int = 10
+
+    # Share of the full training rows the study trains on (set for the
+    # low-fidelity study): min_data_in_leaf is suggested in full-data rows
+    # and scaled by it, so promoted params carry over unchanged
+    row_share: float = 1.0
@@ -1,7 +1,9 @@
 from src.ml.optimization_config import OptimizationConfig
 
 import optuna
+import sqlalchemy
 from optuna.study import Study
+from optuna.trial import TrialState
 
 import logging
 
@@ -16,24 +18,96 @@ class OptunaRunner:
         self.db_path = cfg.output_path + "db/"
         self.params_path = cfg.output_path + "best_params/"
 
-    def run_study(self, objective_fn):
-        storage = f"sqlite:///{self.db_path}optimization_lgbm.db"
-        study_name = f"study_lgbm_binary{self.cfg.name}"
+    @property
+    def study_name(self) -> str:
+        return f"study_lgbm_binary{self.cfg.name}"
 
-        study = optuna.create_study(
+    def storage(self) -> optuna.storages.RDBStorage:
+        # Several worker processes may write to the same sqlite file: wait for its lock
+        storage = optuna.storages.RDBStorage(
+            f"sqlite:///{self.db_path}optimization_lgbm.db",
+            engine_kwargs={"connect_args": {"timeout": 120}}
+        )
+        _serialize_sqlite_transactions(storage.engine)
+        return storage
+
+    def pruner(self) -> optuna.pruners.BasePruner:
+        # Steps are boosting rounds (see GainPruningCallback)
+        cfg = self.cfg
+        min_rounds = max(cfg.prune_interval, cfg.prune_warmup)
+        if cfg.pruner is None:
+            return optuna.pruners.NopPruner()
+        if cfg.pruner == "median":
+            return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=cfg.prune_warmup, interval_steps=cfg.prune_interval)
+        if cfg.pruner == "successive_halving":
+            return optuna.pruners.SuccessiveHalvingPruner(min_resource=min_rounds)
+        if cfg.pruner == "hyperband":
+            return optuna.pruners.HyperbandPruner(min_resource=min_rounds, max_resource=cfg.n_boosts)
+        raise ValueError(f"Unsupported pruner: '{cfg.pruner}'")
+
+    def create_study(self) -> Study:
+        return optuna.create_study(
             direction="maximize",
-            study_name=study_name,
-            storage=storage,
+            study_name=self.study_name,
+            storage=self.storage(),
+            pruner=self.pruner(),
             load_if_exists=True
         )
 
-        logger.info(f"Starting study {study_name}")
-        study.optimize(objective_fn, n_trials=self.cfg.n_trials)
+    def run_study(self, objective_fn, n_trials: int | None = None):
+        study = self.create_study()
+
+        logger.info(f"Starting study {self.study_name}")
+        study.optimize(objective_fn, n_trials=n_trials if n_trials is not None else self.cfg.n_trials)
         return study
 
+    def split_trials(self) -> list[int]:
+        """Trials per worker process, n_trials spread as evenly as possible."""
+        n_workers = min(self.cfg.n_workers, self.cfg.n_trials)
+        return [self.cfg.n_trials // n_workers + (i < self.cfg.n_trials % n_workers) for i in range(n_workers)]
+
+    def record_pruning_stats(self, study: Study) -> dict:
+        """Stores how many trials were pruned, and after how many rounds, as study user attrs."""
+        pruned = study.get_trials(deepcopy=False, states=(TrialState.PRUNED,))
+        complete = study.get_trials(deepcopy=False, states=(TrialState.COMPLETE,))
+        pruned_rounds = [t.last_step for t in pruned if t.last_step is not None]
+        complete_rounds = [t.user_attrs["n_rounds"] for t in complete if "n_rounds" in t.user_attrs]
+
+        stats = {
+            "pruner": self.cfg.pruner,
+            "n_complete": len(complete),
+            "n_pruned": len(pruned),
+            "pruned_share": len(pruned) / max(1, len(pruned) + len(complete)),
+            "mean_pruned_rounds": sum(pruned_rounds) / len(pruned_rounds) if pruned_rounds else None,
+            "mean_complete_rounds": sum(complete_rounds) / len(complete_rounds) if complete_rounds else None,
+        }
+        for key, value in stats.items():
+            study.set_user_attr(key, value)
+
+        logger.info(f"Pruning stats of {self.study_name}: {stats}")
+        return stats
+
     def save_best_params(self, study: Study):
         best_params = study.best_trial.params
         filename = self.params_path + f"best_params_binary{self.cfg.name}.json"
         with open(filename, "w") as f:
             json.dump(best_params, f, indent=4)
         logger.info(f"Best params saved to {filename}")
+
+def _serialize_sqlite_transactions(engine: sqlalchemy.engine.Engine):
+    """
+    sqlite ignores SELECT ... FOR UPDATE, so two workers could both move the
+    same enqueued (WAITING) trial to RUNNING and run it twice. Starting every
+    transaction with BEGIN IMMEDIATE takes the write lock before the read.
+    """
+    @sqlalchemy.event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy emit BEGIN instead of the driver
+        dbapi_connection.isolation_level = None
+
+    @sqlalchemy.event.listens_for(engine, "begin")
+    def _begin(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    # Connections opened while the storage created its tables lack the listeners
+    engine.dispose()
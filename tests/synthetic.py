@@ -0,0 +1,54 @@
+import numpy as np
+import polars as pl
+
+MONTHS = [202101, 202102, 202103, 202104, 202105, 202106, 202107, 202108]
+
+# Every feature family over the columns of make_panel, shared by the engine
+# parity tests and benchmarks/feature_engines.py
+ENGINE_COLUMNS = ["mrentabilidad", "mcaja_ahorro", "ccaja_ahorro", "ctrx_quarter"]
+
+ENGINE_CONFIG = {
+    "lag": {"columns": ENGINE_COLUMNS, "n": 2},
+    "delta": {"columns": ENGINE_COLUMNS, "n": 2},
+    "minmax": {"columns": ENGINE_COLUMNS},
+    "ratio": {"pairs": [["mcaja_ahorro", "ccaja_ahorro"], ["mtarjeta", "ctarjeta"]]},
+    "linreg": {"columns": ENGINE_COLUMNS, "windows": [2, 3], "stats": ["slope", "intercept", "r2"]},
+}
+
+def make_panel(n_clients: int = 300, seed: int = 0, gap: float = 0.1, months: list[int] = MONTHS) -> pl.DataFrame:
+    """
+    Synthetic customer panel with the awkward cases of the real one:
+    customers that start late, leave early or skip months (gaps), nulls,
+    zero denominators for the ratios and a constant cliente_antiguedad for
+    some customers (zero x variance in the trend windows).
+    """
+    rng = np.random.default_rng(seed)
+    ids, foto_mes, antiguedad = [], [], []
+    for client in range(n_clients):
+        start = int(rng.integers(0, 3))
+        end = len(months) - int(rng.integers(0, 3))
+        constant_x = rng.random() < 0.1
+        for i in range(start, end):
+            if rng.random() < gap:
+                continue
+            ids.append(100000 + client)
+            foto_mes.append(months[i])
+            antiguedad.append(12 if constant_x else 10 + i)
+
+    n = len(ids)
+
+    def with_nulls(values: np.ndarray, share: float) -> pl.Series:
+        return pl.Series(values).scatter(np.flatnonzero(rng.random(n) < share), None)
+
+    return pl.DataFrame({
+        "numero_de_cliente": ids,
+        "foto_mes": foto_mes,
+        "cliente_antiguedad": antiguedad,
+        "cliente_edad": rng.integers(18, 90, n),
+        "mrentabilidad": with_nulls(rng.normal(1000, 500, n).round(2), 0.1),
+        "mcaja_ahorro": rng.normal(50000, 9000, n).round(2),
+        "ccaja_ahorro": with_nulls(rng.integers(0, 3, n), 0.1),
+        "ctrx_quarter": rng.integers(-120, 120, n),
+        "mtarjeta": rng.normal(0, 1e5, n),
+        "ctarjeta": rng.integers(0, 2, n),
+    }).sort(["foto_mes", "numero_de_cliente"])
@@ -0,0 +1,34 @@
+import polars as pl
+import pytest
+import src.infra.dataset_store as ds
+
+from polars.testing import assert_frame_equal
+
+from src.core.target import label_clase_ternaria
+from tests.synthetic import make_panel
+
+KEYS = ["numero_de_cliente", "foto_mes"]
+
+@pytest.fixture
+def store(tmp_path) -> tuple[str, pl.DataFrame]:
+    panel = make_panel(n_clients=100)
+    root = str(tmp_path / "store")
+    ds.write_store(label_clase_ternaria(panel.filter(pl.col("foto_mes") < 202108)), root)
+    return root, panel
+
+def test_append_month_matches_full_labeling(store):
+    root, panel = store
+    ds.append_month(panel.filter(pl.col("foto_mes") == 202108), root)
+
+    stored = ds.scan_store(root).collect().sort(KEYS)
+    assert_frame_equal(stored, label_clase_ternaria(panel).select(stored.columns).sort(KEYS), check_dtypes=False)
+
+@pytest.mark.parametrize("month", [202107, 202105])
+def test_append_month_rejects_stored_months(store, month):
+    root, panel = store
+    before = ds.scan_store(root).collect().sort(KEYS)
+
+    with pytest.raises(ValueError, match="not newer"):
+        ds.append_month(panel.filter(pl.col("foto_mes") == month), root)
+
+    assert_frame_equal(ds.scan_store(root).collect().sort(KEYS), before)
@@ -0,0 +1,34 @@
+import polars as pl
+import pytest
+
+from polars.testing import assert_frame_equal
+
+from src.core.feature_engineering import KEYS, plan_features_sql
+from src.infra.duckdb_runner import run_duckdb_query, run_duckdb_query_bucketed
+from tests.synthetic import make_panel
+
+COLUMNS = ["mrentabilidad", "ccaja_ahorro", "ctrx_quarter"]
+
+CONFIG = {
+    "lag": {"columns": COLUMNS, "n": 2},
+    "delta": {"columns": COLUMNS, "n": 2},
+    "minmax": {"columns": COLUMNS},
+    "linreg": {"columns": COLUMNS, "window": 3, "method": "sql"},
+}
+
+@pytest.fixture(scope="module")
+def panel() -> pl.DataFrame:
+    return make_panel()
+
+@pytest.mark.parametrize("n_buckets, n_jobs", [(2, 1), (4, 2), (7, 3)])
+def test_buckets_union_matches_single_query(panel, tmp_path, n_buckets, n_jobs):
+    sql = plan_features_sql(CONFIG)[0]
+    expected = run_duckdb_query(panel, sql).sort(KEYS)
+
+    paths = run_duckdb_query_bucketed(panel, sql, n_buckets, str(tmp_path), n_jobs=n_jobs)
+    buckets = [pl.read_parquet(path) for path in paths]
+
+    assert_frame_equal(pl.concat(buckets).sort(KEYS), expected)
+    # Every customer lands in exactly one bucket
+    customers = [b["numero_de_cliente"].unique() for b in buckets]
+    assert sum(len(c) for c in customers) == panel["numero_de_cliente"].n_unique()
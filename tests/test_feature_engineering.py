@@ -0,0 +1,92 @@
+import polars as pl
+import pytest
+import src.core.dtype_compaction as dc
+import src.infra.dataset_store as ds
+
+from polars.testing import assert_frame_equal
+
+from src.core.feature_engineering import KEYS, append_month_features, feature_engineering_incremental, feature_engineering_pipeline
+from src.core.feature_store import assemble_features
+from tests.synthetic import make_panel
+
+COLUMNS = ["mrentabilidad", "ccaja_ahorro", "ctrx_quarter"]
+
+CONFIG = {
+    "lag": {"columns": COLUMNS, "n": 2},
+    "delta": {"columns": COLUMNS, "n": 2},
+    "ratio": {"pairs": [["mtarjeta", "ctarjeta"]]},
+    "linreg": {"columns": COLUMNS, "window": 3},
+}
+
+@pytest.fixture(scope="module")
+def panel() -> pl.DataFrame:
+    return make_panel()
+
+@pytest.fixture(scope="module")
+def full(panel) -> pl.DataFrame:
+    return feature_engineering_pipeline(panel, CONFIG).sort(KEYS)
+
+def test_column_groups_match_single_query(panel, full):
+    grouped = feature_engineering_pipeline(panel, CONFIG, max_columns=4)
+    assert_frame_equal(grouped.sort(KEYS), full)
+
+def test_column_groups_reject_duplicated_keys(panel):
+    duplicated = pl.concat([panel, panel.head(1)])
+    with pytest.raises(ValueError, match="Duplicated"):
+        feature_engineering_pipeline(duplicated, CONFIG, max_columns=4)
+
+@pytest.mark.parametrize("engine", ["duckdb", "polars", "numpy"])
+@pytest.mark.parametrize("months", [[202106], [202103, 202104, 202105], [202102, 202107]])
+def test_output_months_match_full_history(panel, full, engine, months):
+    # The panel has customers with gaps: the lookback is counted in rows, not months
+    expected = full.filter(pl.col("foto_mes").is_in(months))
+    pruned = feature_engineering_pipeline(panel, CONFIG, engine=engine, output_months=months)
+    assert_frame_equal(pruned.sort(KEYS), expected, check_dtypes=False, rel_tol=1e-9)
+
+def test_incremental_month_matches_full_history(panel, full):
+    new_month = 202107
+    incremental = feature_engineering_incremental(panel, CONFIG, new_month)
+    expected = full.filter(pl.col("foto_mes") == new_month)
+    assert_frame_equal(incremental.sort(KEYS), expected)
+
+def test_append_month_features_matches_full_history(panel, full, tmp_path):
+    source_root, feature_root = str(tmp_path / "data"), str(tmp_path / "features")
+    ds.write_store(panel, source_root)
+
+    for new_month in (202107, 202108):
+        append_month_features(source_root, feature_root, CONFIG, new_month)
+
+    stored = ds.scan_store(feature_root).collect()
+    expected = full.filter(pl.col("foto_mes").is_in([202107, 202108]))
+    assert_frame_equal(stored.select(expected.columns).sort(KEYS), expected)
+
+def test_drop_features_only_prunes_what_the_models_saw(panel, full):
+    # A list built from models without linreg features must not drop linreg
+    drop_features = {"mrentabilidad_lag_1", "mrentabilidad_lag_2", "ccaja_ahorro_delta_1", "ratio_mtarjeta_ctarjeta", "ctrx_quarter"}
+    pruned = feature_engineering_pipeline(panel, CONFIG, drop_features=drop_features)
+    expected = full.drop(drop_features - {"ctrx_quarter"})
+    assert_frame_equal(pruned.sort(KEYS), expected)
+
+@pytest.mark.parametrize("output_months", [None, [202106, 202107]])
+def test_feature_store_matches_pipeline(panel, full, tmp_path, output_months):
+    assembled = assemble_features(panel, CONFIG, str(tmp_path), output_months=output_months)
+    expected = full if output_months is None else full.filter(pl.col("foto_mes").is_in(output_months))
+    assert_frame_equal(assembled.select(expected.columns), expected)
+    assert sorted(assembled.columns) == sorted(expected.columns)
+    assert assembled.columns[:panel.width] == panel.columns
+
+@pytest.mark.parametrize("engine", ["duckdb", "polars", "numpy"])
+def test_compacted_panel_matches_raw_panel(panel, engine):
+    # ctrx_quarter fits Int8 but its deltas do not: the pipeline widens and restores it
+    config = {**CONFIG, "minmax": {"columns": COLUMNS}}
+    compacted = dc.compact_dtypes(panel, floats=False)
+    assert compacted.schema["ctrx_quarter"] == pl.Int8
+
+    expected = feature_engineering_pipeline(panel, config, engine=engine).sort(KEYS)
+    got = feature_engineering_pipeline(compacted, config, engine=engine).sort(KEYS)
+    assert_frame_equal(got, expected, check_dtypes=False)
+
+    # Features holding source values keep the compact type of their column
+    for col in COLUMNS:
+        for name in [col, f"{col}_MAX", f"{col}_MIN", f"{col}_lag_1", f"{col}_lag_2"]:
+            assert got.schema[name] == compacted.schema[col], name
@@ -0,0 +1,78 @@
+import lightgbm as lgb
+import numpy as np
+import pytest
+
+from src.ml.gain_metric import POSITIVE_WEIGHT, GainMetric
+
+GAIN, COST = 780000.0, 20000.0
+
+def full_sort_gain(y_pred: np.ndarray, weight: np.ndarray, multiplier: np.ndarray | None = None) -> float:
+    """The former gan_eval: sort the whole fold, cumulative gain, maximum."""
+    gain = np.where(weight == POSITIVE_WEIGHT, GAIN, 0)
+    cost = np.where(weight < POSITIVE_WEIGHT, COST, 0)
+    if multiplier is not None:
+        cost = cost * multiplier
+    # Stable descending order, so tied scores keep their row order
+    ganancia = (gain - cost)[np.argsort(-y_pred, kind="stable")]
+    return float(np.max(np.cumsum(ganancia)))
+
+def make_fold(n: int, seed: int, positive_share: float = 0.01) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    label = (rng.random(n) < positive_share).astype(int)
+    weight = np.where(label == 1, POSITIVE_WEIGHT, rng.choice([1.0, 1.00001], n))
+    return label, weight
+
+def dataset(label: np.ndarray, weight: np.ndarray) -> lgb.Dataset:
+    X = np.zeros((len(label), 1))
+    return lgb.Dataset(X, label=label, weight=weight, free_raw_data=False, params={"verbose": -1}).construct()
+
+def informative_scores(label: np.ndarray, rng: np.random.Generator, decimals: int | None) -> np.ndarray:
+    y_pred = 0.3 * label + rng.random(len(label))
+    return y_pred if decimals is None else np.round(y_pred, decimals)
+
+# decimals=None gives distinct scores; 1 and 2 decimals give heavy ties,
+# also across the K-th place
+@pytest.mark.parametrize("decimals", [None, 2, 1])
+@pytest.mark.parametrize("seed", range(5))
+def test_matches_full_sort(seed, decimals):
+    label, weight = make_fold(5000, seed)
+    data = dataset(label, weight)
+    metric = GainMetric(GAIN, COST)
+    rng = np.random.default_rng(100 + seed)
+    for _ in range(3):
+        y_pred = informative_scores(label, rng, decimals)
+        assert metric.value(y_pred, data) == full_sort_gain(y_pred, weight)
+
+def test_constant_scores_use_row_order():
+    # First boosting round: every row has the same score
+    label, weight = make_fold(2000, 0, positive_share=0.05)
+    y_pred = np.full(len(label), 0.05)
+    assert GainMetric(GAIN, COST).value(y_pred, dataset(label, weight)) == full_sort_gain(y_pred, weight)
+
+def test_falls_back_to_full_sort_when_top_k_is_negative():
+    # Positives ranked last: every prefix within the top K loses money
+    label, weight = make_fold(3000, 1)
+    y_pred = np.where(label == 1, 0.0, np.random.default_rng(1).random(len(label)) + 1)
+    data = dataset(label, weight)
+    value = GainMetric(GAIN, COST).value(y_pred, data)
+    assert value < 0
+    assert value == full_sort_gain(y_pred, weight)
+
+def test_cv_folds_with_cost_multiplier():
+    # Undersampled CONTINUA carry a cost multiplier; lgb.cv folds are subsets
+    # of the training Dataset, so the per-row arrays are read by used_indices
+    rng = np.random.default_rng(2)
+    label, weight = make_fold(6000, 2, positive_share=0.03)
+    multiplier = np.where(label == 1, 1.0, rng.choice([1.0, 4.0], len(label)))
+    full = dataset(label, weight)
+    metric = GainMetric(GAIN, COST, positives=weight == POSITIVE_WEIGHT, cost_multiplier=multiplier)
+
+    for fold in np.array_split(rng.permutation(len(label)), 3):
+        idx = np.sort(fold)
+        data = full.subset(idx.tolist()).construct()
+        for decimals in (None, 2):
+            y_pred = informative_scores(label[idx], rng, decimals)
+            expected = full_sort_gain(y_pred, weight[idx], multiplier[idx])
+            assert metric.value(y_pred, data) == expected
+            # Second call on the same fold reuses the cached gains
+            assert metric(y_pred, data) == ("gan_eval", expected, True)
@@ -0,0 +1,31 @@
+import polars as pl
+import pytest
+import src.infra.dataset_store as ds
+import src.infra.loader_utils as lu
+
+from polars.testing import assert_frame_equal
+
+from tests.synthetic import make_panel
+
+KEYS = ["numero_de_cliente", "foto_mes"]
+
+@pytest.fixture(scope="module")
+def panel() -> pl.DataFrame:
+    return make_panel()
+
+@pytest.fixture
+def sources(panel, tmp_path) -> dict[str, str]:
+    ds.write_store(panel, str(tmp_path / "store"))
+    panel.write_parquet(tmp_path / "panel.parquet")
+    return {"store": str(tmp_path / "store"), "parquet": str(tmp_path / "panel.parquet")}
+
+@pytest.mark.parametrize("format", ["store", "parquet"])
+@pytest.mark.parametrize("months", [[202106], [202103, 202107]])
+def test_lookback_counts_rows_per_customer(panel, sources, format, months):
+    loaded = lu.load_data(sources[format], format, months=months, lookback=2, columns=["mrentabilidad"])
+
+    # Customers with gaps need rows older than two calendar months
+    expected = lu.rows_with_lookback(panel, months, 2).select(KEYS + ["mrentabilidad"])
+    calendar = [lu.shift_month(m, -k) for m in months for k in range(3)]
+    assert expected.filter(~pl.col("foto_mes").is_in(calendar)).height > 0
+    assert_frame_equal(loaded.sort(KEYS), expected.sort(KEYS))